@@ -1,19 +1,36 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash
 import os
+import atexit
+import click
 from datetime import datetime
 from bson.objectid import ObjectId
 
 from pymongo import MongoClient
-from flask_bcrypt import Bcrypt
-
-
-from .config import Config
+from pymongo.errors import PyMongoError, DuplicateKeyError
+
+
+from .config import Config, mongo_client_options, validate
+from . import archive, inventory, rollups, imports, ledger
+from .indexes import ensure_indexes, audit
+from .catalog import catalog_cache, bump
+from .jobs import job_queue
+from .kpis import kpi_hub, visible
+from .metrics import request_metrics
+from .assets import assets
+from .passwords import password_hasher
+from .tenancy import current_business_id, scoped, backfill, TENANT_COLLECTIONS
 from .models.user import User
+from .models.rows import UserRow, fetch
+from .pagination import Page, page_args
 from .routes.products import bp as products_bp
 from .routes.suppliers import bp as suppliers_bp
 from .routes.purchases import bp as purchases_bp
 from .routes.pos import bp as pos_bp
 from .routes.sales import bp as sales_bp
+from .routes.reports import bp as reports_bp
+from .routes.exports import bp as exports_bp
+from .routes.metrics import bp as metrics_bp
+from .routes.dashboard import bp as dashboard_bp
 
 
 app = Flask(
@@ -24,17 +41,44 @@ app = Flask(
 
 app.config.from_object(Config)
 app.secret_key = app.config['SECRET_KEY']
-
-bcrypt = Bcrypt(app)
-client = MongoClient(app.config["MONGODB_URI"])
+catalog_cache.max_entries = app.config['CATALOG_CACHE_SIZE']
+
+password_hasher.configure(rounds=app.config['BCRYPT_LOG_ROUNDS'], workers=app.config['PASSWORD_HASH_WORKERS'])
+atexit.register(password_hasher.shutdown)
+config_errors, config_warnings = validate(app.config)
+for warning in config_warnings:
+    app.logger.warning('Config: %s', warning)
+if config_errors:
+    raise RuntimeError('Invalid configuration: ' + '; '.join(config_errors))
+
+client = MongoClient(app.config["MONGODB_URI"], event_listeners=[request_metrics.listener],
+                     **mongo_client_options(app.config))
 db = client.stockflow
 app.db = db
+job_queue.configure(db, workers=app.config['JOB_WORKERS'], backend=app.config['JOB_BACKEND'],
+                    max_attempts=app.config['JOB_MAX_ATTEMPTS'])
+atexit.register(job_queue.drain)
+kpi_hub.configure(db, app.config['REPORT_UTC_OFFSET_HOURS'], interval=app.config['KPI_REFRESH_SECONDS'],
+                  max_streams=app.config['KPI_STREAM_LIMIT'])
+
+if app.config['ENSURE_INDEXES']:
+    try:
+        for collection, error in ensure_indexes(db):
+            app.logger.warning('Could not create index on %s: %s', collection, error)
+    except PyMongoError as e:
+        app.logger.warning('Could not create indexes at startup: %s', e)
 
 app.register_blueprint(products_bp)
 app.register_blueprint(suppliers_bp)
 app.register_blueprint(purchases_bp)
 app.register_blueprint(pos_bp)
 app.register_blueprint(sales_bp)
+app.register_blueprint(reports_bp)
+app.register_blueprint(exports_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(dashboard_bp)
+request_metrics.init_app(app)
+assets.init_app(app)
 
 
 @app.route('/')
@@ -51,7 +95,13 @@ def login():
         password = request.form['password']
 
         user = db.users.find_one({"username": username})
-        if user and bcrypt.check_password_hash(user['password_hash'], password):
+        if user and password_hasher.check(user['password_hash'], password):
+            # Move the stored hash to the configured work factor while we have the password
+            if password_hasher.needs_rehash(user['password_hash']):
+                db.users.update_one(
+                    {"_id": user['_id'], "password_hash": user['password_hash']},
+                    {"$set": {"password_hash": password_hasher.hash(password)}}
+                )
             session['user_id'] = str(user['_id'])
             session['username'] = user['username']
             session['role'] = user['role']
@@ -87,7 +137,11 @@ def signup():
             user_dict = user.to_dict()
             if role != "super_admin":
                 user_dict['business_id'] = None  
-            db.users.insert_one(user_dict)
+            try:
+                db.users.insert_one(user_dict)
+            except DuplicateKeyError:
+                flash('Username already exists', 'error')
+                return render_template('signup.html')
             flash('Account created successfully! Please log in.', 'success')
             return redirect(url_for('login'))
 
@@ -105,22 +159,33 @@ def dashboard():
         
         total_businesses = db.businesses.count_documents({})
         total_users = db.users.count_documents({})
+        page, per_page = page_args()
         
-       
-        all_users = list(db.users.find({}, {
-            "username": 1,
-            "role": 1,
-            "business_id": 1,
-            "created_at": 1
-        }).sort("created_at", -1))
-        
+        # One round trip: page of users joined to their business name.
+        users_page = db.users.aggregate([
+            {"$sort": {"created_at": -1}},
+            {"$skip": (page - 1) * per_page},
+            {"$limit": per_page},
+            {"$lookup": {
+                "from": "businesses",
+                "localField": "business_id",
+                "foreignField": "_id",
+                "as": "business"
+            }},
+            {"$project": {
+                "username": 1,
+                "role": 1,
+                "business_id": 1,
+                "created_at": 1,
+                "business_name": {"$arrayElemAt": ["$business.name", 0]}
+            }}
+        ])
         
         users_with_business = []
-        for user in all_users:
+        for user in users_page:
             business_name = "—"
             if user.get('business_id'):
-                biz = db.businesses.find_one({"_id": user['business_id']}, {"name": 1})
-                business_name = biz['name'] if biz else "Unknown"
+                business_name = user.get('business_name') or "Unknown"
             users_with_business.append({
                 "username": user['username'],
                 "role": user['role'],
@@ -128,31 +193,27 @@ def dashboard():
                 "created": user['created_at'].strftime('%b %d, %Y')
             })
         
-       
-        all_businesses = list(db.businesses.find().sort("created_at", -1))
+        recent_businesses = list(db.businesses.find(
+            {}, {"name": 1, "location": 1, "created_at": 1}
+        ).sort("created_at", -1).limit(10))
         
         return render_template('dashboard.html',
                                is_super_admin=True,
                                total_businesses=total_businesses,
                                total_users=total_users,
                                users=users_with_business,
-                               businesses=all_businesses,
+                               users_page=Page(users_with_business, page, per_page, total_users),
+                               businesses=recent_businesses,
                                business_name="System Control Panel")
     else:
         
-        products = list(db.products.find())
-        
-        total_products = len(products)
-        total_stock_value = sum(p.get('current_quantity', 0) * p.get('purchase_price', 0) for p in products)
-        potential_sales_value = sum(p.get('current_quantity', 0) * p.get('selling_price', 0) for p in products)
-        low_stock_count = len([p for p in products if p.get('current_quantity', 0) < p.get('min_stock', 10)])
+        # Shared with /dashboard/kpis and the live stream
+        version, kpis = kpi_hub.current(current_business_id())
         
         return render_template('dashboard.html',
                                is_super_admin=False,
-                               total_products=total_products,
-                               total_stock_value=total_stock_value,
-                               potential_sales_value=potential_sales_value,
-                               low_stock_count=low_stock_count,
+                               kpis=visible(kpis, user_role),
+                               kpis_version=version,
                                business_name=session.get('business_name', 'StockFlow'))
 
 @app.route('/users')
@@ -161,7 +222,9 @@ def users():
         flash('Admin access required', 'danger')
         return redirect(url_for('dashboard'))
 
-    all_users = list(db.users.find())
+    # Branch admins only manage their own branch
+    query = {} if session.get('role') == 'super_admin' else scoped()
+    all_users = fetch(db.users, UserRow, query)
     return render_template('users.html', users=all_users)
 
 
@@ -177,16 +240,19 @@ def add_user():
     if db.users.find_one({"username": username}):
         flash('Username already exists', 'danger')
     else:
-        hashed = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed = password_hasher.hash(password)
         new_user = {
             "username": username,
             "password_hash": hashed,
             "role": role,
             "created_at": datetime.utcnow(),
-            "business_id": None 
+            "business_id": current_business_id()
         }
-        db.users.insert_one(new_user)
-        flash('User added successfully!', 'success')
+        try:
+            db.users.insert_one(new_user)
+            flash('User added successfully!', 'success')
+        except DuplicateKeyError:
+            flash('Username already exists', 'danger')
 
     return redirect(url_for('users'))
 
@@ -200,7 +266,10 @@ def delete_user(user_id):
         flash('You cannot delete yourself!', 'danger')
         return redirect(url_for('users'))
 
-    db.users.delete_one({"_id": ObjectId(user_id)})
+    query = {"_id": ObjectId(user_id)}
+    if session.get('role') != 'super_admin':
+        query = scoped(query)
+    db.users.delete_one(query)
     flash('User deleted', 'info')
     return redirect(url_for('users'))
 
@@ -213,24 +282,25 @@ def businesses():
         flash('Access denied: Super Admin only', 'danger')
         return redirect(url_for('dashboard'))
     
-    # Fetch all businesses, sorted newest first
-    all_businesses = list(db.businesses.find().sort("created_at", -1))
+    page, per_page = page_args()
+    page_businesses = list(db.businesses.find().sort("created_at", -1)
+                           .skip((page - 1) * per_page).limit(per_page))
     
-    # Build enriched list with admin usernames
-    businesses_with_admins = []
-    for biz in all_businesses:
-        admins = list(db.users.find(
-            {"business_id": biz['_id'], "role": "admin"},
-            {"username": 1, "_id": 0}
-        ))
-        admin_usernames = [admin['username'] for admin in admins]
-        
-        businesses_with_admins.append({
-            "business": biz,
-            "admins": admin_usernames
-        })
+    # Second query joins every admin on this page in memory
+    admins_by_business = {}
+    for admin in db.users.find(
+        {"business_id": {"$in": [biz['_id'] for biz in page_businesses]}, "role": "admin"},
+        {"username": 1, "business_id": 1, "_id": 0}
+    ):
+        admins_by_business.setdefault(admin['business_id'], []).append(admin['username'])
+    
+    businesses_with_admins = [
+        {"business": biz, "admins": admins_by_business.get(biz['_id'], [])}
+        for biz in page_businesses
+    ]
+    pagination = Page(businesses_with_admins, page, per_page, db.businesses.count_documents({}))
     
-    return render_template('businesses.html', businesses=businesses_with_admins)
+    return render_template('businesses.html', businesses=businesses_with_admins, pagination=pagination)
 
 
 @app.route('/businesses/create', methods=['POST'])
@@ -261,14 +331,19 @@ def create_business():
     business_id = business_result.inserted_id
     
     
-    hashed = bcrypt.generate_password_hash(admin_password).decode('utf-8')
-    db.users.insert_one({
-        "username": admin_username,
-        "password_hash": hashed,
-        "role": "admin",
-        "business_id": business_id,
-        "created_at": datetime.utcnow()
-    })
+    hashed = password_hasher.hash(admin_password)
+    try:
+        db.users.insert_one({
+            "username": admin_username,
+            "password_hash": hashed,
+            "role": "admin",
+            "business_id": business_id,
+            "created_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        db.businesses.delete_one({"_id": business_id})
+        flash('Username already exists', 'danger')
+        return redirect(url_for('businesses'))
     
     flash(f'Business "{business_name}" created with admin "{admin_username}"!', 'success')
     return redirect(url_for('businesses') + '?t=' + str(int(datetime.utcnow().timestamp())))
@@ -309,6 +384,124 @@ def delete_business(business_id):
     
     return redirect(url_for('businesses'))
 
+@app.cli.command('reconcile-inventory')
+def reconcile_inventory():
+    """Rebuild the dashboard inventory summaries from the products collection."""
+    for summary in inventory.reconcile_all(db):
+        print(f"{summary['_id']}: {summary['total_products']} products, "
+              f"{summary['low_stock_count']} low on stock")
+
+
+@app.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    """Create every index in the registry (safe to re-run)."""
+    failures = ensure_indexes(db)
+    for collection, error in failures:
+        print(f"{collection}: {error}")
+    if failures:
+        raise SystemExit(1)
+    print('Indexes are up to date.')
+
+
+@app.cli.command('audit-indexes')
+def audit_indexes_command():
+    """Explain each route's query shape and flag collection scans."""
+    problems = 0
+    for route, collection, stages, problem in audit(db):
+        print(f"{'!!' if problem else 'ok'} {route:<16} {collection:<10} {' <- '.join(stages)}")
+        problems += bool(problem)
+    if problems:
+        raise SystemExit(1)
+
+
+@app.cli.command('backfill-business-ids')
+@click.option('--business-id', default=None, help='Business for documents that cannot be attributed.')
+def backfill_business_ids(business_id):
+    """Stamp business_id on products, suppliers, sales and purchases written before tenant scoping."""
+    updated = backfill(db, ObjectId(business_id) if business_id else None)
+    for collection in TENANT_COLLECTIONS:
+        print(f"{collection}: {updated[collection]} stamped, "
+              f"{db[collection].count_documents({'business_id': None})} still unassigned")
+    # Documents moved between scopes: rebuild summaries, reload every catalog
+    bump(db, None, deleted=True)
+    for summary in inventory.reconcile_all(db):
+        bump(db, summary['_id'], deleted=True)
+
+
+@app.cli.command('backfill-rollups')
+@click.option('--since', default=None, help='Rebuild from this local day (YYYY-MM-DD); default is all history.')
+def backfill_rollups(since):
+    """Rebuild hourly and daily sales rollups from the sales collection."""
+    since = datetime.strptime(since, '%Y-%m-%d') if since else None
+    processed = rollups.rebuild(db, app.config['REPORT_UTC_OFFSET_HOURS'], since)
+    print(f"Rolled up {processed} sales.")
+
+
+@app.cli.command('retry-failed-jobs')
+def retry_failed_jobs():
+    """Queue jobs that ran out of attempts (JOB_BACKEND=mongo) to run again."""
+    result = db.jobs.update_many(
+        {"status": "failed"},
+        {"$set": {"status": "queued", "attempts": 0, "run_at": datetime.utcnow()}}
+    )
+    print(f"Requeued {result.modified_count} jobs.")
+
+
+@app.cli.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--business-id', default=None, help='Business the products belong to.')
+@click.option('--chunk-size', default=imports.CHUNK_SIZE, show_default=True)
+def import_products_command(path, business_id, chunk_size):
+    """Upsert products from a CSV or JSON price list."""
+    def progress(result):
+        print(f"{result['rows']} rows, {result['inserted']} added, {result['updated']} updated, "
+              f"{len(result['errors'])} errors ({result['rows'] / max(result['seconds'], 1e-9):.0f} rows/s)")
+
+    with open(path, 'rb') as stream:
+        try:
+            result = imports.import_products(db, imports.parse(stream, path), ObjectId(business_id) if business_id else None,
+                                             chunk_size=chunk_size, progress=progress)
+        except imports.ImportFormatError as e:
+            raise click.ClickException(str(e))
+    for error in result['errors']:
+        print(f"row {error['row']}: {error['message']}")
+
+
+@app.cli.command('archive-sales')
+@click.option('--days', default=None, type=int, help='Keep this many days hot (default SALES_HOT_DAYS).')
+@click.option('--batch-size', default=None, type=int, help='Sales moved per batch (default SALES_ARCHIVE_BATCH).')
+@click.option('--max-batches', default=None, type=int, help='Stop after this many batches; re-run to resume.')
+def archive_sales_command(days, batch_size, max_batches):
+    """Move sales older than the hot window into monthly archive collections."""
+    moved = archive.archive_sales(db, days or app.config['SALES_HOT_DAYS'],
+                                  batch_size or app.config['SALES_ARCHIVE_BATCH'], max_batches)
+    print(f"Archived {moved} sales.")
+    for month in db.sales_archive_months.find().sort("month", 1):
+        print(f"{month['_id']}: {month['count']} sales")
+
+
+@app.cli.command('snapshot-stock')
+def snapshot_stock():
+    """Snapshot every business' stock ledger balances (run periodically, e.g. nightly)."""
+    for business_id, products in ledger.snapshot_all(db).items():
+        print(f"{business_id}: {products} products")
+
+
+@app.cli.command('audit-stock-ledger')
+@click.option('--fix', is_flag=True, help='Record correcting movements (opening balances for new ledgers).')
+def audit_stock_ledger(fix):
+    """Compare stock ledger balances with products.current_quantity."""
+    mismatched = 0
+    for business_id in db.products.distinct("business_id"):
+        found = ledger.discrepancies(db, business_id)
+        mismatched += len(found)
+        print(f"{business_id}: {len(found)} products differ")
+        if fix and found:
+            print(f"  recorded {ledger.true_up(db, business_id, by='audit-stock-ledger')} movements")
+    if mismatched and not fix:
+        raise SystemExit(1)
+
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -0,0 +1,127 @@
+"""Monthly archive collections for old sales.
+
+Sales dated before the hot window move, unchanged, from ``sales`` into
+``sales_archive_YYYY_MM`` by the month of their date, so the hot
+collection and its indexes only cover recent trade. ``sales_archive_months``
+lists the months that exist. History and receipt lookups go through
+``sales_collections`` and ``find_sale``, which read hot and archived
+sales alike.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import BulkWriteError
+
+from .jobs import task
+
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'sales_archive_'
+ARCHIVE_INDEXES = [
+    IndexModel([("business_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)]),
+]
+
+
+def month_name(date):
+    return f"{PREFIX}{date.year:04d}_{date.month:02d}"
+
+
+def _months(db):
+    # Newest first
+    return list(db.sales_archive_months.find({}, {"month": 1}).sort("month", -1))
+
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def sales_collections(db, query=None):
+    """The hot collection plus every archive month ``query``'s date range can reach."""
+    dates = (query or {}).get('date') or {}
+    start, end = dates.get('$gte'), dates.get('$lt')
+    collections = [db.sales]
+    for month in _months(db):
+        if start is not None and _next_month(month['month']) <= start:
+            continue
+        if end is not None and month['month'] >= end:
+            continue
+        collections.append(db[month['_id']])
+    return collections
+
+
+def find_sale(db, query):
+    """find_one on sales by ``_id`` (plus any scope), falling back to the archive.
+
+    The month the id was created in is tried first; a sale is normally
+    dated before it was recorded, so that or an earlier month holds it.
+    """
+    sale = db.sales.find_one(query)
+    if sale is not None:
+        return sale
+    created = month_name(query['_id'].generation_time)
+    names = [m['_id'] for m in _months(db)]
+    # Newest first from the creation month back, then any later (misdated) months
+    for name in [n for n in names if n <= created] + [n for n in names if n > created]:
+        sale = db[name].find_one(query)
+        if sale is not None:
+            return sale
+    return None
+
+
+def _copy(db, name, sales):
+    try:
+        return len(db[name].insert_many(sales, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # A batch interrupted after copying is copied again; keep going
+        errors = e.details['writeErrors']
+        if any(error['code'] != 11000 for error in errors):
+            raise
+        return e.details['nInserted']
+
+
+def archive_batch(db, business_id, cutoff, batch_size=1000):
+    """Move up to ``batch_size`` of the oldest sales dated before ``cutoff``.
+
+    Sales are copied into their month's collection before they are deleted
+    from ``sales``, and copies are keyed on the original _id, so a batch
+    cut short by a crash is simply repeated. Returns the number moved.
+    """
+    sales = list(db.sales.find({"business_id": business_id, "date": {"$lt": cutoff}})
+                 .sort([("date", ASCENDING), ("_id", ASCENDING)]).limit(batch_size))
+    if not sales:
+        return 0
+    by_month = {}
+    for sale in sales:
+        by_month.setdefault(month_name(sale['date']), []).append(sale)
+    for name, batch in by_month.items():
+        first = batch[0]['date']
+        db.sales_archive_months.update_one(
+            {"_id": name},
+            {"$setOnInsert": {"month": datetime(first.year, first.month, 1), "count": 0}},
+            upsert=True
+        )
+        db[name].create_indexes(ARCHIVE_INDEXES)
+        copied = _copy(db, name, batch)
+        db.sales_archive_months.update_one(
+            {"_id": name}, {"$inc": {"count": copied}, "$set": {"archived_at": datetime.utcnow()}}
+        )
+    db.sales.delete_many({"_id": {"$in": [sale['_id'] for sale in sales]}})
+    return len(sales)
+
+
+@task('sales.archive')
+def archive_sales(db, hot_days, batch_size=1000, max_batches=None):
+    """Archive every business' sales older than ``hot_days``, a batch at a time."""
+    cutoff = datetime.utcnow() - timedelta(days=hot_days)
+    moved, batches = 0, 0
+    for business_id in db.sales.distinct("business_id"):
+        while max_batches is None or batches < max_batches:
+            count = archive_batch(db, business_id, cutoff, batch_size)
+            if not count:
+                break
+            moved += count
+            batches += 1
+    logger.info('Archived %d sales dated before %s', moved, cutoff)
+    return moved
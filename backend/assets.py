@@ -0,0 +1,74 @@
+import hashlib
+import os
+import threading
+
+from flask import request
+
+
+# Fingerprinted URLs change with the content, so a browser can keep them forever
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+class Assets:
+    """Content-hash URLs for static files and a build id for page ETags.
+
+    ``url_for('static', filename=...)`` gains ``?v=<hash of the file>``;
+    requests carrying the current hash are served as immutable for a year.
+    """
+
+    def __init__(self):
+        self.build = ''
+        self._folder = None
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._folder = app.static_folder
+        # Pages cached by ETag must change when a deploy changes templates or assets
+        build = hashlib.sha256()
+        for folder in (os.path.join(app.root_path, app.template_folder), app.static_folder):
+            for root, _, files in sorted(os.walk(folder)):
+                for name in sorted(files):
+                    build.update(name.encode())
+                    build.update(_digest(os.path.join(root, name)).encode())
+        self.build = build.hexdigest()[:12]
+        app.url_defaults(self._add_fingerprint)
+        app.after_request(self._cache_headers)
+
+    def fingerprint(self, filename):
+        path = os.path.join(self._folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._hashes.get(filename)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, _digest(path))
+            with self._lock:
+                self._hashes[filename] = cached
+        return cached[1]
+
+    def _add_fingerprint(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            fingerprint = self.fingerprint(values['filename'])
+            if fingerprint:
+                values['v'] = fingerprint
+
+    def _cache_headers(self, response):
+        if request.endpoint != 'static' or response.status_code != 200:
+            return response
+        filename = (request.view_args or {}).get('filename')
+        if filename and request.args.get('v') == self.fingerprint(filename):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+
+assets = Assets()
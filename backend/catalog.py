@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from .search import SearchIndex
+from .tenancy import scope_key
+
+
+# Re-read a little before the last sync so writes that were in flight
+# while we refreshed are not missed.
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+def bump(db, business_id, deleted=False):
+    """Record that the catalog of ``business_id`` changed.
+
+    Every write to products must set ``updated_at`` and call this. Deletes
+    cannot be seen by an ``updated_at`` delta, so they also move the epoch,
+    which forces caches to reload the whole catalog.
+    """
+    change = {"version": 1}
+    if deleted:
+        change["epoch"] = 1
+    db.catalog_versions.update_one(
+        {"_id": scope_key(business_id)}, {"$inc": change, "$currentDate": {"updated_at": True}},
+        upsert=True
+    )
+
+
+def bump_suppliers(db, business_id):
+    # Suppliers share the version document but not the product cache's counters
+    db.catalog_versions.update_one(
+        {"_id": scope_key(business_id)}, {"$inc": {"suppliers": 1}, "$currentDate": {"updated_at": True}},
+        upsert=True
+    )
+
+
+def catalog_state(db, business_id):
+    return db.catalog_versions.find_one({"_id": scope_key(business_id)}) or {}
+
+
+def current_version(db, business_id):
+    state = catalog_state(db, business_id)
+    return state.get('version', 0), state.get('epoch', 0)
+
+
+class _Entry:
+    __slots__ = ('version', 'epoch', 'synced_at', 'products', 'names', 'search')
+
+    def __init__(self, version, epoch, synced_at, products, search=None):
+        self.version = version
+        self.epoch = epoch
+        self.synced_at = synced_at
+        self.products = products
+        self.search = search
+        self.names = {str(pid): p.get('name', 'Unknown') for pid, p in products.items()}
+
+
+class CatalogCache:
+    """Per-process, per-business copy of the products collection.
+
+    Each read costs one primary-key lookup of the business' catalog version;
+    when it moved, only products with a newer ``updated_at`` are fetched.
+    A refresh replaces the entry rather than updating it, so a template
+    iterating an old snapshot is unaffected. The one thing set on an
+    existing entry is its search index, built from the entry's own products
+    on the first search and not changed after that.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, db, business_id):
+        version, epoch = current_version(db, business_id)
+        with self._lock:
+            entry = self._entries.get(business_id)
+            if entry is not None:
+                self._entries.move_to_end(business_id)
+                if entry.epoch == epoch and entry.version == version:
+                    self.hits += 1
+                    return entry
+
+        synced_at = datetime.utcnow()
+        search = None
+        if entry is not None and entry.epoch == epoch:
+            products = dict(entry.products)
+            changed = list(db.products.find({
+                "business_id": business_id,
+                "updated_at": {"$gte": entry.synced_at - REFRESH_OVERLAP}
+            }))
+            for product in changed:
+                products[product['_id']] = product
+            # Its own index: readers of the old entry must not see new ids
+            if entry.search is not None:
+                search = entry.search.copy()
+                search.update(changed)
+            refreshed = True
+        else:
+            products = {p['_id']: p for p in db.products.find({"business_id": business_id})}
+            refreshed = False
+
+        entry = _Entry(version, epoch, synced_at, products, search)
+        with self._lock:
+            if refreshed:
+                self.refreshes += 1
+            else:
+                self.misses += 1
+            self._entries[business_id] = entry
+            self._entries.move_to_end(business_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def products(self, db, business_id=None):
+        # Shared documents: callers must treat them as read-only.
+        return list(self._entry(db, business_id).products.values())
+
+    def names(self, db, business_id=None):
+        return self._entry(db, business_id).names
+
+    def search(self, db, query, limit=10, business_id=None, in_stock=False):
+        entry = self._entry(db, business_id)
+        if entry.search is None:
+            search = SearchIndex(entry.products.values())
+            with self._lock:
+                # A concurrent first search may have got there first; keep its index
+                if entry.search is None:
+                    entry.search = search
+        include = None
+        if in_stock:
+            include = lambda product_id: entry.products[product_id].get('current_quantity', 0) > 0
+        return [entry.products[product_id] for product_id in entry.search.search(query, limit, include)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "evictions": self.evictions,
+            }
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,55 @@
+import hashlib
+from functools import wraps
+
+from flask import request, session, current_app as app, make_response
+
+from .assets import assets
+from .catalog import catalog_state
+from .tenancy import current_business_id
+
+
+# Everything in the session that the sidebar or the page body renders
+SESSION_FIELDS = ('user_id', 'username', 'role', 'business_id', 'business_name')
+
+
+def _etag(fields, state):
+    parts = [assets.build, request.endpoint, request.full_path]
+    parts += [str(session.get(name)) for name in SESSION_FIELDS]
+    parts += [f"{name}={state.get(name, 0)}" for name in fields]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def catalog_conditional(*fields):
+    """Answer 304 when the catalog_versions ``fields`` of the business
+    have not moved since the client's copy of this page.
+
+    The check is one primary-key lookup; the view, its queries and its
+    template only run when the page changed. Pages with pending flash
+    messages always render, since base.html shows and consumes them.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'user_id' not in session or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            # Read the versions before rendering: a write landing in between
+            # leaves a stale ETag, which only costs the client one more render
+            state = catalog_state(app.db, current_business_id())
+            etag = _etag(fields, state)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if state.get('updated_at'):
+                response.last_modified = state['updated_at']
+            # Per-user pages: browsers may keep them but must revalidate
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -1,3 +1,4 @@
+import importlib.util
 import os
 from dotenv import load_dotenv
 
@@ -5,4 +6,133 @@ load_dotenv()
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-fallback'
-    MONGODB_URI = os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017/stockflow'
\ No newline at end of file
+    MONGODB_URI = os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017/stockflow'
+    CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE') or 64)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'memory'  # or 'text' for the Mongo text index
+    POS_INITIAL_PRODUCTS = int(os.environ.get('POS_INITIAL_PRODUCTS') or 24)
+    # Kenya (EAT) has no daylight saving, so a fixed offset is enough
+    REPORT_UTC_OFFSET_HOURS = int(os.environ.get('REPORT_UTC_OFFSET_HOURS') or 3)
+    ENSURE_INDEXES = (os.environ.get('ENSURE_INDEXES') or 'true').lower() == 'true'
+    # Post-checkout work runs on background threads; 0 runs it inline.
+    # JOB_BACKEND=mongo keeps queued jobs in the jobs collection across restarts.
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_BACKEND = os.environ.get('JOB_BACKEND') or 'memory'
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 5)
+    # bcrypt work factor; stored hashes are upgraded on the next login after a change
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS') or 12)
+    # Processes per app process for hashing; 0 hashes on the request thread
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+    # Sales older than this move to monthly archive collections (flask archive-sales)
+    SALES_HOT_DAYS = int(os.environ.get('SALES_HOT_DAYS') or 180)
+    SALES_ARCHIVE_BATCH = int(os.environ.get('SALES_ARCHIVE_BATCH') or 1000)
+    # Live dashboard: figures are recomputed at most this often per business and process
+    KPI_REFRESH_SECONDS = int(os.environ.get('KPI_REFRESH_SECONDS') or 5)
+    # Each open stream holds a request thread (gthread) until it ends and reconnects
+    KPI_STREAM_LIMIT = int(os.environ.get('KPI_STREAM_LIMIT') or 4)
+    KPI_STREAM_SECONDS = int(os.environ.get('KPI_STREAM_SECONDS') or 300)
+    # Requests sending more Mongo commands than this are logged; 0 turns it off
+    QUERY_COUNT_WARNING = int(os.environ.get('QUERY_COUNT_WARNING') or 25)
+    METRICS_SERVER_TIMING = (os.environ.get('METRICS_SERVER_TIMING') or 'false').lower() == 'true'
+    # Scrapers send it as a bearer token; without one /metrics is super admin only
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Production profile, read by gunicorn.conf.py. gthread serves several
+    # requests per worker while others wait on Mongo; gevent needs the
+    # gevent package. Each worker process has its own Mongo pool.
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY') or 2)
+    GUNICORN_WORKER_CLASS = os.environ.get('GUNICORN_WORKER_CLASS') or 'gthread'
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS') or 8)
+    GUNICORN_WORKER_CONNECTIONS = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 100)
+    GUNICORN_TIMEOUT = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+    GUNICORN_KEEPALIVE = int(os.environ.get('GUNICORN_KEEPALIVE') or 5)
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE') or 16)
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE') or 2)
+    MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS') or 5000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS') or 5000)
+    MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS') or 20000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS') or 2000)
+    MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE') or 'primary'
+    MONGO_WRITE_CONCERN = os.environ.get('MONGO_WRITE_CONCERN') or 'majority'
+    MONGO_RETRY_WRITES = (os.environ.get('MONGO_RETRY_WRITES') or 'true').lower() == 'true'
+    MONGO_RETRY_READS = (os.environ.get('MONGO_RETRY_READS') or 'true').lower() == 'true'
+
+
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+READ_PREFERENCES = ('primary', 'primaryPreferred', 'secondary', 'secondaryPreferred', 'nearest')
+
+
+def request_concurrency(config):
+    # Requests one worker process serves at the same time
+    worker_class = config['GUNICORN_WORKER_CLASS']
+    if worker_class == 'gthread':
+        return config['GUNICORN_THREADS']
+    if worker_class == 'gevent':
+        return config['GUNICORN_WORKER_CONNECTIONS']
+    return 1
+
+
+def mongo_client_options(config):
+    write_concern = config['MONGO_WRITE_CONCERN']
+    return {
+        "maxPoolSize": config['MONGO_MAX_POOL_SIZE'],
+        "minPoolSize": config['MONGO_MIN_POOL_SIZE'],
+        "connectTimeoutMS": config['MONGO_CONNECT_TIMEOUT_MS'],
+        "serverSelectionTimeoutMS": config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        "socketTimeoutMS": config['MONGO_SOCKET_TIMEOUT_MS'],
+        "waitQueueTimeoutMS": config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        "readPreference": config['MONGO_READ_PREFERENCE'],
+        "w": int(write_concern) if write_concern.isdigit() else write_concern,
+        "retryWrites": config['MONGO_RETRY_WRITES'],
+        "retryReads": config['MONGO_RETRY_READS'],
+    }
+
+
+def validate(config):
+    """Check the server and pool settings against each other.
+
+    Returns (errors, warnings): errors are settings that cannot work,
+    warnings are sizes that will queue or time out under load.
+    """
+    errors, warnings = [], []
+    worker_class = config['GUNICORN_WORKER_CLASS']
+    if worker_class not in WORKER_CLASSES:
+        errors.append(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}")
+    elif worker_class == 'gevent' and importlib.util.find_spec('gevent') is None:
+        errors.append("GUNICORN_WORKER_CLASS=gevent needs the gevent package installed")
+    if config['MONGO_READ_PREFERENCE'] not in READ_PREFERENCES:
+        errors.append(f"MONGO_READ_PREFERENCE must be one of {', '.join(READ_PREFERENCES)}")
+    write_concern = config['MONGO_WRITE_CONCERN']
+    if write_concern != 'majority' and not write_concern.isdigit():
+        errors.append("MONGO_WRITE_CONCERN must be 'majority' or a number of nodes")
+    for setting in ('WEB_CONCURRENCY', 'GUNICORN_THREADS', 'MONGO_MAX_POOL_SIZE'):
+        if config[setting] < 1:
+            errors.append(f"{setting} must be at least 1")
+    if config['MONGO_MIN_POOL_SIZE'] > config['MONGO_MAX_POOL_SIZE']:
+        errors.append("MONGO_MIN_POOL_SIZE cannot exceed MONGO_MAX_POOL_SIZE")
+
+    # Request threads and job workers share the process' pool
+    connections = request_concurrency(config) + config['JOB_WORKERS']
+    if config['MONGO_MAX_POOL_SIZE'] < connections:
+        warnings.append(
+            f"MONGO_MAX_POOL_SIZE={config['MONGO_MAX_POOL_SIZE']} is below the {connections} concurrent "
+            f"users per worker ({worker_class} requests + JOB_WORKERS); requests will wait for connections"
+        )
+    if worker_class != 'gevent' and config['KPI_STREAM_LIMIT'] >= request_concurrency(config):
+        warnings.append(
+            f"KPI_STREAM_LIMIT={config['KPI_STREAM_LIMIT']} live dashboards can take every one of the "
+            f"{request_concurrency(config)} request threads per worker"
+        )
+    timeout_ms = config['GUNICORN_TIMEOUT'] * 1000
+    for setting in ('MONGO_SOCKET_TIMEOUT_MS', 'MONGO_SERVER_SELECTION_TIMEOUT_MS', 'MONGO_WAIT_QUEUE_TIMEOUT_MS'):
+        if config[setting] >= timeout_ms:
+            warnings.append(
+                f"{setting}={config[setting]} is not below GUNICORN_TIMEOUT; gunicorn will kill the worker "
+                f"before the driver gives up"
+            )
+    hashers = config['WEB_CONCURRENCY'] * config['PASSWORD_HASH_WORKERS']
+    if hashers > (os.cpu_count() or 1) * 2:
+        warnings.append(
+            f"{hashers} password hashing processes (WEB_CONCURRENCY x PASSWORD_HASH_WORKERS) "
+            f"on {os.cpu_count()} CPUs"
+        )
+    return errors, warnings
@@ -0,0 +1,183 @@
+import csv
+import heapq
+import io
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from . import archive
+
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+
+
+def _sale_rows(sale, names):
+    for item in sale['items']:
+        yield [
+            sale['date'].strftime('%Y-%m-%d %H:%M:%S'), str(sale['_id']),
+            sale.get('cashier_name', ''), sale.get('payment_method', 'cash'),
+            item['product_id'], item.get('product_name') or names.get(str(item['product_id']), 'Unknown'),
+            item.get('unit', ''), item['quantity'], item['selling_price'], item.get('cost_price', ''),
+            item['quantity'] * item['selling_price'],
+        ]
+
+
+def _purchase_rows(purchase, names):
+    for item in purchase['items']:
+        yield [
+            purchase['date'].strftime('%Y-%m-%d %H:%M:%S'), str(purchase['_id']),
+            purchase.get('supplier_name', ''),
+            item['product_id'], item.get('product_name') or names.get(str(item['product_id']), 'Unknown'),
+            item.get('unit', ''), item['quantity'], item['cost_price'],
+            item['quantity'] * item['cost_price'],
+        ]
+
+
+def _document_row(fields):
+    def rows(doc, names):
+        yield ['' if doc.get(field) is None else doc[field] for field in fields]
+    return rows
+
+
+PRODUCT_FIELDS = ['name', 'description', 'unit', 'purchase_price', 'selling_price',
+                  'min_stock', 'max_stock', 'current_quantity']
+SUPPLIER_FIELDS = ['name', 'contact_person', 'phone', 'email', 'address']
+
+# kind -> (collection, dated, projection, header, rows(doc, names))
+EXPORTS = {
+    "sales": ("sales", True,
+              {"date": 1, "cashier_name": 1, "payment_method": 1, "items": 1},
+              ['date', 'sale_id', 'cashier', 'payment_method', 'product_id', 'product_name',
+               'unit', 'quantity', 'selling_price', 'cost_price', 'line_total'],
+              _sale_rows),
+    "purchases": ("purchases", True,
+                  {"date": 1, "supplier_name": 1, "items": 1},
+                  ['date', 'purchase_id', 'supplier', 'product_id', 'product_name',
+                   'unit', 'quantity', 'cost_price', 'line_total'],
+                  _purchase_rows),
+    "products": ("products", False,
+                 dict.fromkeys(PRODUCT_FIELDS, 1), PRODUCT_FIELDS, _document_row(PRODUCT_FIELDS)),
+    "suppliers": ("suppliers", False,
+                  dict.fromkeys(SUPPLIER_FIELDS, 1), SUPPLIER_FIELDS, _document_row(SUPPLIER_FIELDS)),
+}
+
+
+def rows(db, kind, query, names):
+    """Yield the header and then every row, reading the cursor in batches.
+
+    Sales come from the hot collection and every archive month in range,
+    merged by date.
+    """
+    collection, dated, projection, header, to_rows = EXPORTS[kind]
+    collections = archive.sales_collections(db, query) if collection == 'sales' else [db[collection]]
+    cursors = []
+    for source in collections:
+        cursor = source.find(query, projection).batch_size(BATCH_SIZE)
+        if dated:
+            cursor = cursor.sort([("date", 1), ("_id", 1)])
+        cursors.append(cursor)
+    docs = heapq.merge(*cursors, key=lambda doc: (doc['date'], doc['_id'])) if len(cursors) > 1 else cursors[0]
+    yield header
+    for doc in docs:
+        yield from to_rows(doc, names)
+
+
+def csv_stream(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _Pipe(io.RawIOBase):
+    # Unseekable sink: zipfile then writes data descriptors instead of
+    # seeking back, so the archive can be sent while it is being built.
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+def xlsx_stream(rows):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield pipe.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        b'<sheetData>')
+            for row in rows:
+                sheet.write(('<row>' + ''.join(_xlsx_cell(v) for v in row) + '</row>').encode('utf-8'))
+                if sum(len(c) for c in pipe.chunks) >= CHUNK_SIZE:
+                    yield pipe.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield pipe.drain()
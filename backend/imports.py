@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from . import inventory, ledger
+from .catalog import bump
+from .models.product import Product
+
+
+CHUNK_SIZE = 500
+FIELDS = ('name', 'sku', 'description', 'unit', 'purchase_price', 'selling_price',
+          'min_stock', 'max_stock', 'current_quantity')
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def parse(stream, filename):
+    """Yield (row_number, dict) from an uploaded CSV or JSON price list."""
+    if filename.lower().endswith('.json'):
+        try:
+            data = json.load(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+        except ValueError as e:
+            raise ImportFormatError(f'Invalid JSON: {e}')
+        if isinstance(data, dict):
+            data = data.get('products')
+        if not isinstance(data, list):
+            raise ImportFormatError('JSON must be a list of products or {"products": [...]}')
+        yield from enumerate(data, start=1)
+    elif filename.lower().endswith('.csv'):
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        # Row numbers as a spreadsheet shows them: the header is row 1
+        try:
+            for number, row in enumerate(reader, start=2):
+                yield number, row
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ImportFormatError(f'Could not read the CSV file: {e}')
+    else:
+        raise ImportFormatError('Upload a .csv or .json file')
+
+
+def _clean(row):
+    if not isinstance(row, dict):
+        raise ValueError('row is not an object')
+    cleaned = {}
+    for field in FIELDS:
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            cleaned[field] = value
+    if not cleaned.get('name'):
+        raise ValueError('name is required')
+    return cleaned
+
+
+def _upsert(row, business_id, now):
+    product = Product.from_dict(row).to_dict()
+    if product['purchase_price'] < 0 or product['selling_price'] < 0:
+        raise ValueError('prices cannot be negative')
+    product['business_id'] = business_id
+    key = {"business_id": business_id}
+    if product['sku']:
+        key['sku'] = product['sku']
+    else:
+        key['name'] = product['name']
+
+    # Only the columns the file supplied overwrite an existing product, so
+    # a price list without quantities does not zero the stock on hand.
+    present = {field: product[field] for field in row}
+    present['updated_at'] = now
+    defaults = {field: value for field, value in product.items()
+                if field not in present and field not in key}
+    defaults['created_at'] = now
+    # Chosen here so a new product's stock can be recorded against it
+    defaults['_id'] = ObjectId()
+    op = UpdateOne(key, {"$set": present, "$setOnInsert": defaults}, upsert=True)
+    return op, (key, present.get('current_quantity'), defaults['_id'])
+
+
+def _identity(key):
+    return ('sku', key['sku']) if 'sku' in key else ('name', key['name'])
+
+
+def _quantities_before(db, stock):
+    """{identity: [product_id, current_quantity]} of existing products that rows set a quantity for."""
+    keys = [key for key, quantity, _ in stock if quantity is not None]
+    if not keys:
+        return {}
+    found = {}
+    for product in db.products.find({"$or": keys}, {"sku": 1, "name": 1, "current_quantity": 1}):
+        entry = [product['_id'], product.get('current_quantity', 0)]
+        if product.get('sku'):
+            found.setdefault(('sku', product['sku']), entry)
+        found.setdefault(('name', product.get('name')), entry)
+    return found
+
+
+def _record_movements(db, business_id, stock, before, details):
+    # Only the rows of this chunk that set a quantity and were written;
+    # a row matching no product before the write inserted one.
+    failed = {error['index'] for error in details.get('writeErrors', [])}
+    opening, changes = {}, {}
+    for i, (key, quantity, new_id) in enumerate(stock):
+        if quantity is None or i in failed:
+            continue
+        identity = _identity(key)
+        if identity not in before:
+            opening[new_id] = quantity
+            before[identity] = [new_id, quantity]
+            continue
+        product_id, previous = before[identity]
+        if product_id in opening:
+            opening[product_id] = quantity
+        else:
+            changes[product_id] = changes.get(product_id, 0) + quantity - previous
+        before[identity][1] = quantity
+    return (ledger.record(db, business_id, opening, 'opening')
+            + ledger.record(db, business_id, changes, 'import'))
+
+
+def _write(db, ops, numbers, result, business_id, stock):
+    before = _quantities_before(db, stock)
+    try:
+        outcome = db.products.bulk_write(ops, ordered=False)
+        details = outcome.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for error in details['writeErrors']:
+            result['errors'].append({"row": numbers[error['index']], "message": error['errmsg']})
+    result['inserted'] += details.get('nUpserted', 0)
+    result['updated'] += details.get('nMatched', 0)
+    _record_movements(db, business_id, stock, before, details)
+
+
+def import_products(db, rows, business_id, chunk_size=CHUNK_SIZE, progress=None):
+    """Upsert products from (row_number, dict) pairs in unordered bulk writes.
+
+    Products are matched on SKU when the row has one, otherwise on name,
+    within ``business_id``. Invalid rows are skipped and reported; they do
+    not stop the rest of the file. ``progress(result)`` is called after
+    every chunk. The inventory summary is rebuilt and the catalog bumped
+    once at the end. Quantities the file sets go to the stock ledger as the
+    change from what each product held before its chunk was written.
+    Returns counts, per-row errors and elapsed seconds.
+    """
+    started = time.perf_counter()
+    result = {"rows": 0, "inserted": 0, "updated": 0, "errors": [], "seconds": 0.0}
+    now = datetime.utcnow()
+    ops, numbers, stock = [], [], []
+
+    for number, row in rows:
+        result['rows'] += 1
+        try:
+            op, entry = _upsert(_clean(row), business_id, now)
+            ops.append(op)
+            stock.append(entry)
+            numbers.append(number)
+        except (KeyError, TypeError, ValueError) as e:
+            result['errors'].append({"row": number, "message": str(e)})
+        if len(ops) >= chunk_size:
+            _write(db, ops, numbers, result, business_id, stock)
+            ops, numbers, stock = [], [], []
+            result['seconds'] = time.perf_counter() - started
+            if progress:
+                progress(result)
+    if ops:
+        _write(db, ops, numbers, result, business_id, stock)
+    if result['inserted'] or result['updated']:
+        inventory.reconcile(db, business_id)
+        bump(db, business_id)
+    result['seconds'] = time.perf_counter() - started
+    if progress:
+        progress(result)
+    return result
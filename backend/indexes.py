@@ -0,0 +1,141 @@
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+
+# Every index the application relies on, per collection. Keep the key
+# specs unnamed: create_indexes() is a no-op for an index that already
+# exists with the same keys and options, which makes this safe to apply
+# on every start.
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("business_id", ASCENDING), ("role", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "businesses": [
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "products": [
+        IndexModel([("business_id", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("business_id", ASCENDING), ("current_quantity", ASCENDING)]),
+        IndexModel([("business_id", ASCENDING), ("name", TEXT), ("description", TEXT)]),
+        IndexModel([("business_id", ASCENDING), ("name", ASCENDING)]),
+        IndexModel([("business_id", ASCENDING), ("sku", ASCENDING)],
+                   partialFilterExpression={"sku": {"$type": "string"}}),
+        # Only products below min_stock are indexed, so low-stock reads cost O(low items)
+        IndexModel([("business_id", ASCENDING), ("is_low_stock", ASCENDING), ("name", ASCENDING)],
+                   partialFilterExpression={"is_low_stock": True}),
+    ],
+    "suppliers": [
+        IndexModel([("business_id", ASCENDING), ("name", ASCENDING)]),
+    ],
+    "sales": [
+        IndexModel([("business_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)]),
+        # Offline tills retry queued sales; a key is only ever recorded once
+        IndexModel([("business_id", ASCENDING), ("idempotency_key", ASCENDING)], unique=True,
+                   partialFilterExpression={"idempotency_key": {"$type": "string"}}),
+    ],
+    "purchases": [
+        IndexModel([("business_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "stock_movements": [
+        IndexModel([("product_id", ASCENDING), ("at", ASCENDING)]),
+        IndexModel([("business_id", ASCENDING), ("at", ASCENDING)]),
+    ],
+    "stock_snapshots": [
+        IndexModel([("business_id", ASCENDING), ("at", DESCENDING)]),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)]),
+    ],
+    "sales_rollups": [
+        IndexModel([("business_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)], unique=True),
+    ],
+}
+
+
+# Indexes an earlier registry created that are now covered by a
+# business-led one; dropped by ensure_indexes().
+OBSOLETE_INDEXES = {
+    "products": ["current_quantity_1", "name_text_description_text"],
+    "sales": ["date_-1__id_-1"],
+    "purchases": ["date_-1__id_-1"],
+}
+
+
+# The query shapes routes actually issue, as (route, collection, filter, sort).
+QUERY_SHAPES = [
+    ("login", "users", {"username": "cashier"}, None),
+    ("signup", "users", {"username": "cashier"}, None),
+    ("dashboard", "users", {}, [("created_at", DESCENDING)]),
+    ("dashboard", "businesses", {}, [("created_at", DESCENDING)]),
+    ("businesses", "users", {"business_id": {"$in": [ObjectId()]}, "role": "admin"}, None),
+    ("users", "users", {"business_id": ObjectId()}, None),
+    ("catalog", "products", {"business_id": ObjectId()}, None),
+    ("catalog", "products", {"business_id": ObjectId(), "updated_at": {"$gte": datetime.utcnow()}}, None),
+    ("products.import", "products", {"business_id": ObjectId(), "name": "Sugar 1kg"}, None),
+    ("products.import", "products", {"business_id": ObjectId(), "sku": "SKU-1"}, None),
+    ("products.low_stock", "products", {"business_id": ObjectId(), "is_low_stock": True}, [("name", ASCENDING)]),
+    ("pos.search", "products", {"business_id": ObjectId(), "current_quantity": {"$gt": 0}}, None),
+    ("suppliers.index", "suppliers", {"business_id": ObjectId()}, None),
+    ("sales.index", "sales", {"business_id": ObjectId()}, [("date", DESCENDING), ("_id", DESCENDING)]),
+    ("pos.checkout", "sales", {"business_id": ObjectId(), "idempotency_key": {"$in": ["till-1"]}}, None),
+    ("purchases.index", "purchases", {"business_id": ObjectId()}, [("date", DESCENDING), ("_id", DESCENDING)]),
+    ("products.movements", "stock_movements", {"product_id": ObjectId()}, [("at", ASCENDING)]),
+    ("ledger.balances", "stock_movements", {"business_id": ObjectId(), "at": {"$lte": datetime.utcnow()}}, None),
+    ("ledger.balances", "stock_snapshots", {"business_id": ObjectId(), "at": {"$lte": datetime.utcnow()}},
+     [("at", DESCENDING)]),
+    ("reports.sales", "sales_rollups",
+     {"business_id": ObjectId(), "granularity": "day", "bucket": {"$gte": datetime.utcnow()}}, [("bucket", ASCENDING)]),
+]
+
+
+def ensure_indexes(db):
+    """Create every registered index; returns a list of (collection, error)."""
+    failures = []
+    for collection, names in OBSOLETE_INDEXES.items():
+        existing = db[collection].index_information()
+        for name in names:
+            if name in existing:
+                db[collection].drop_index(name)
+    for collection, models in INDEXES.items():
+        for model in models:
+            try:
+                db[collection].create_indexes([model])
+            except OperationFailure as e:
+                failures.append((collection, e))
+    return failures
+
+
+def _stages(plan):
+    yield plan['stage']
+    if 'inputStage' in plan:
+        yield from _stages(plan['inputStage'])
+    for child in plan.get('inputStages', []):
+        yield from _stages(child)
+
+
+def audit(db):
+    """Explain each registered query shape and report its plan.
+
+    Returns (route, collection, stages, problem) tuples, where problem is
+    'COLLSCAN', 'SORT' (sorted in memory) or None.
+    """
+    report = []
+    for route, collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query).limit(50)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()['queryPlanner']['winningPlan']
+        plan = plan.get('queryPlan', plan)
+        stages = list(_stages(plan))
+        problem = None
+        if 'COLLSCAN' in stages:
+            problem = 'COLLSCAN'
+        elif 'SORT' in stages:
+            problem = 'SORT'
+        report.append((route, collection, stages, problem))
+    return report
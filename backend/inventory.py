@@ -0,0 +1,173 @@
+from datetime import datetime
+
+from .tenancy import scope_key
+
+
+DEFAULT_MIN_STOCK = 10
+SUMMARY_FIELDS = ("total_products", "total_stock_value", "potential_sales_value", "low_stock_count")
+VALUE_FIELDS = {
+    "business_id": 1,
+    "current_quantity": 1,
+    "purchase_price": 1,
+    "selling_price": 1,
+    "min_stock": 1,
+}
+
+# Server-side form of _is_low, for aggregations and pipeline updates
+IS_LOW_STOCK = {"$lt": [
+    {"$ifNull": ["$current_quantity", 0]},
+    {"$ifNull": ["$min_stock", DEFAULT_MIN_STOCK]}
+]}
+
+
+def _is_low(quantity, product):
+    return quantity < product.get('min_stock', DEFAULT_MIN_STOCK)
+
+
+def contribution(product, sign=1):
+    # What a single product adds to its business' summary document.
+    quantity = product.get('current_quantity', 0)
+    return {
+        "total_products": sign,
+        "total_stock_value": sign * quantity * product.get('purchase_price', 0),
+        "potential_sales_value": sign * quantity * product.get('selling_price', 0),
+        "low_stock_count": sign * int(_is_low(quantity, product)),
+    }
+
+
+def difference(before, after):
+    old, new = contribution(before), contribution(after)
+    return {field: new[field] - old[field] for field in new}
+
+
+def stock_change_deltas(products, changes):
+    # ``changes`` maps product _id -> signed quantity change; ``products`` is
+    # the pre-change snapshot (VALUE_FIELDS) of those products. Low stock is
+    # left to refresh_low_stock_count: two concurrent sales of one product
+    # would both judge the crossing from the same snapshot.
+    deltas = {}
+    for product_id, change in changes.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        delta = deltas.setdefault(product.get('business_id'), {
+            "total_stock_value": 0,
+            "potential_sales_value": 0,
+        })
+        delta["total_stock_value"] += change * product.get('purchase_price', 0)
+        delta["potential_sales_value"] += change * product.get('selling_price', 0)
+    return deltas
+
+
+def weighted_cost(quantity, cost, received, received_value):
+    # Moving average cost once ``received`` units costing ``received_value``
+    # in total arrive. Negative stock on hand carries no cost weight.
+    on_hand = max(quantity, 0)
+    return (on_hand * cost + received_value) / (on_hand + received)
+
+
+def receipt_deltas(products, receipts):
+    # ``receipts`` maps product _id -> (units received, their total cost);
+    # ``products`` is the pre-delivery snapshot (VALUE_FIELDS).
+    deltas = {}
+    for product_id, (received, received_value) in receipts.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        before = product.get('current_quantity', 0)
+        cost = product.get('purchase_price', 0)
+        after = before + received
+        delta = deltas.setdefault(product.get('business_id'), {
+            "total_stock_value": 0,
+            "potential_sales_value": 0,
+        })
+        delta["total_stock_value"] += after * weighted_cost(before, cost, received, received_value) - before * cost
+        delta["potential_sales_value"] += received * product.get('selling_price', 0)
+    return deltas
+
+
+def apply_delta(db, business_id, delta):
+    result = db.inventory_summary.update_one(
+        {"_id": scope_key(business_id)},
+        {"$inc": delta, "$set": {"updated_at": datetime.utcnow()}}
+    )
+    if result.matched_count == 0:
+        # No summary yet: count the products, which already include this change
+        reconcile(db, business_id)
+
+
+def apply_deltas(db, deltas):
+    for business_id, delta in deltas.items():
+        apply_delta(db, business_id, delta)
+
+
+def refresh_low_stock_count(db, business_id):
+    """Set low_stock_count from the is_low_stock flags, which the stock
+    writes keep atomically. A count started earlier never overwrites one
+    started later."""
+    counted_at = datetime.utcnow()
+    count = db.products.count_documents({"business_id": business_id, "is_low_stock": True})
+    db.inventory_summary.update_one(
+        {"_id": scope_key(business_id), "$or": [
+            {"low_stock_counted_at": {"$exists": False}},
+            {"low_stock_counted_at": {"$lt": counted_at}},
+        ]},
+        {"$set": {"low_stock_count": count, "low_stock_counted_at": counted_at}}
+    )
+
+
+def _summaries(db, match):
+    return list(db.products.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": "$business_id",
+            "total_products": {"$sum": 1},
+            "total_stock_value": {"$sum": {"$multiply": [
+                {"$ifNull": ["$current_quantity", 0]}, {"$ifNull": ["$purchase_price", 0]}
+            ]}},
+            "potential_sales_value": {"$sum": {"$multiply": [
+                {"$ifNull": ["$current_quantity", 0]}, {"$ifNull": ["$selling_price", 0]}
+            ]}},
+            "low_stock_count": {"$sum": {"$cond": [IS_LOW_STOCK, 1, 0]}},
+        }},
+    ]))
+
+
+def _store(db, summary):
+    summary['_id'] = scope_key(summary['_id'])
+    summary['updated_at'] = datetime.utcnow()
+    db.inventory_summary.replace_one({"_id": summary['_id']}, summary, upsert=True)
+    return summary
+
+
+def refresh_low_stock(db, match):
+    # The stock paths keep is_low_stock current as they write; this covers
+    # products written any other way (imports, documents from before the flag).
+    db.products.update_many(match, [{"$set": {"is_low_stock": IS_LOW_STOCK}}])
+
+
+def reconcile(db, business_id):
+    refresh_low_stock(db, {"business_id": business_id})
+    summaries = _summaries(db, {"business_id": business_id})
+    summary = summaries[0] if summaries else {
+        "_id": business_id,
+        "total_products": 0,
+        "total_stock_value": 0,
+        "potential_sales_value": 0,
+        "low_stock_count": 0,
+    }
+    return _store(db, summary)
+
+
+def reconcile_all(db):
+    refresh_low_stock(db, {})
+    summaries = [_store(db, summary) for summary in _summaries(db, {})]
+    db.inventory_summary.delete_many({"_id": {"$nin": [s['_id'] for s in summaries]}})
+    return summaries
+
+
+def get_summary(db, business_id=None):
+    summary = db.inventory_summary.find_one({"_id": scope_key(business_id)})
+    if summary is None or any(field not in summary for field in SUMMARY_FIELDS):
+        summary = reconcile(db, business_id)
+    return summary
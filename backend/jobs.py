@@ -0,0 +1,239 @@
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    """Register a function as a background task; it is called as fn(db, **payload)."""
+    def register(fn):
+        TASKS[name] = fn
+        return fn
+    return register
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "p50": round(ordered[len(ordered) // 2], 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class JobQueue:
+    """Runs registered tasks on worker threads, off the request.
+
+    The 'memory' backend keeps jobs in a heap in this process. The 'mongo'
+    backend stores them in the jobs collection, so they survive a restart
+    and any worker process can run them; a job left running by a crashed
+    process is picked up again once its lease expires. Failed jobs are
+    retried with exponential backoff until ``max_attempts``. With
+    ``workers=0`` tasks run inline, which is what CLI commands want.
+    """
+
+    LEASE = timedelta(minutes=5)
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, workers=2, backend='memory', max_attempts=5, backoff=0.5):
+        self.db = None
+        self.workers = workers
+        self.backend = backend
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._threads = []
+        self._pid = None
+        self._stopping = False
+        self._active = 0
+        self._waits = deque(maxlen=1000)
+        self._runs = deque(maxlen=1000)
+        self.counters = {"submitted": 0, "completed": 0, "retried": 0, "failed": 0}
+
+    def configure(self, db, workers=None, backend=None, max_attempts=None):
+        self.db = db
+        if workers is not None:
+            self.workers = workers
+        if backend is not None:
+            self.backend = backend
+        if max_attempts is not None:
+            self.max_attempts = max_attempts
+
+    def submit(self, name, **payload):
+        if name not in TASKS:
+            raise KeyError(f'Unknown task {name}')
+        with self._cond:
+            self.counters['submitted'] += 1
+        if not self.workers or self._stopping:
+            self._execute({"name": name, "payload": payload, "attempts": 1, "queued_at": time.time()}, inline=True)
+            return
+        if self.backend == 'mongo':
+            now = datetime.utcnow()
+            self.db.jobs.insert_one({
+                "name": name, "payload": payload, "status": "queued",
+                "attempts": 0, "run_at": now, "created_at": now
+            })
+        else:
+            self._push({"name": name, "payload": payload, "attempts": 0}, time.time())
+        self._ensure_started()
+        with self._cond:
+            self._cond.notify()
+
+    def _push(self, job, run_at):
+        job['queued_at'] = run_at
+        with self._cond:
+            heapq.heappush(self._heap, (run_at, next(self._seq), job))
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so a pre-forking server starts a
+        # fresh pool in each worker process on its first job.
+        with self._cond:
+            if self._pid == os.getpid() or self._stopping:
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._work, name=f'jobs-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def _claim(self):
+        if self.backend == 'mongo':
+            now = datetime.utcnow()
+            job = self.db.jobs.find_one_and_update(
+                {"$or": [
+                    {"status": "queued", "run_at": {"$lte": now}},
+                    {"status": "running", "locked_at": {"$lt": now - self.LEASE}},
+                ]},
+                {"$set": {"status": "running", "locked_at": now}, "$inc": {"attempts": 1}},
+                sort=[("run_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job:
+                job['queued_at'] = time.time() - (now - job['run_at']).total_seconds()
+            return job
+        with self._cond:
+            # While draining, retries still backing off run straight away
+            if self._heap and (self._stopping or self._heap[0][0] <= time.time()):
+                job = heapq.heappop(self._heap)[2]
+                job['attempts'] += 1
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except PyMongoError as e:
+                logger.warning('Could not claim a job: %s', e)
+                job = None
+            if job is not None:
+                self._execute(job)
+                continue
+            with self._cond:
+                if self._stopping:
+                    return
+                timeout = self.POLL_INTERVAL
+                if self._heap:
+                    timeout = min(timeout, max(0, self._heap[0][0] - time.time()))
+                self._cond.wait(timeout)
+
+    def _execute(self, job, inline=False):
+        started = time.time()
+        with self._cond:
+            self._active += 1
+            self._waits.append((started - job['queued_at']) * 1000)
+        try:
+            TASKS[job['name']](self.db, **job['payload'])
+        except Exception as e:
+            if inline:
+                with self._cond:
+                    self.counters['failed'] += 1
+                logger.exception('Job %s failed', job['name'])
+            else:
+                self._retry(job, e)
+        else:
+            with self._cond:
+                self.counters['completed'] += 1
+            if self.backend == 'mongo' and not inline:
+                self.db.jobs.delete_one({"_id": job['_id']})
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._runs.append((time.time() - started) * 1000)
+                self._cond.notify_all()
+
+    def _retry(self, job, error):
+        if job['attempts'] >= self.max_attempts:
+            with self._cond:
+                self.counters['failed'] += 1
+            logger.error('Job %s failed after %d attempts: %s', job['name'], job['attempts'], error)
+            if self.backend == 'mongo':
+                self.db.jobs.update_one({"_id": job['_id']}, {"$set": {"status": "failed", "error": str(error)}})
+            return
+        with self._cond:
+            self.counters['retried'] += 1
+        delay = self.backoff * 2 ** (job['attempts'] - 1) * (0.5 + random.random())
+        logger.warning('Job %s failed (attempt %d), retrying in %.1fs: %s',
+                       job['name'], job['attempts'], delay, error)
+        if self.backend == 'mongo':
+            self.db.jobs.update_one({"_id": job['_id']}, {"$set": {
+                "status": "queued", "error": str(error),
+                "run_at": datetime.utcnow() + timedelta(seconds=delay)
+            }})
+        else:
+            self._push(job, time.time() + delay)
+
+    def drain(self, timeout=30):
+        """Stop taking new work and wait for queued jobs to finish."""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.time() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.time()))
+        with self._cond:
+            if self._heap:
+                logger.warning('%d jobs were still queued at shutdown', len(self._heap))
+
+    def stats(self):
+        with self._cond:
+            stats = {
+                "backend": self.backend,
+                "workers": self.workers,
+                "active": self._active,
+                "queue_depth": len(self._heap),
+                "wait_ms": _percentiles(self._waits),
+                "run_ms": _percentiles(self._runs),
+                **self.counters,
+            }
+        if self.backend == 'mongo' and self.db is not None:
+            try:
+                stats['queue_depth'] = self.db.jobs.count_documents({"status": "queued"})
+                stats['failed_jobs'] = self.db.jobs.count_documents({"status": "failed"})
+            except PyMongoError:
+                pass
+        return stats
+
+
+job_queue = JobQueue()
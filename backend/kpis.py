@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+from . import inventory, rollups
+
+
+logger = logging.getLogger(__name__)
+
+# Cost figures; cashiers do not see them anywhere else either
+ADMIN_ONLY = ('stock_value', 'today_cost', 'today_margin')
+# Versions remembered per business for ?since= deltas
+HISTORY = 32
+
+
+def compute(db, business_id, offset_hours):
+    """Dashboard figures: the inventory summary and today's (local) sales rollup."""
+    summary = inventory.get_summary(db, business_id)
+    today = rollups.bucket_start(rollups.local_time(datetime.utcnow(), offset_hours), 'day')
+    bucket = db.sales_rollups.find_one(
+        {"business_id": business_id, "granularity": "day", "bucket": today},
+        {"sales": 1, "units": 1, "revenue": 1, "cost": 1, "margin": 1}
+    ) or {}
+    return {
+        "total_products": summary['total_products'],
+        "stock_value": round(summary['total_stock_value'], 2),
+        "potential_sales_value": round(summary['potential_sales_value'], 2),
+        "low_stock_count": summary['low_stock_count'],
+        "today_sales": bucket.get('sales', 0),
+        "today_units": bucket.get('units', 0),
+        "today_revenue": round(bucket.get('revenue', 0), 2),
+        "today_cost": round(bucket.get('cost', 0), 2),
+        "today_margin": round(bucket.get('margin', 0), 2),
+    }
+
+
+def version_of(values):
+    # Content-addressed, so every worker process agrees on a version
+    return hashlib.sha1(json.dumps(values, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def visible(values, role):
+    if role in ('admin', 'super_admin'):
+        return dict(values)
+    return {k: v for k, v in values.items() if k not in ADMIN_ONLY}
+
+
+class KpiHub:
+    """Shares one KPI computation per business among every viewer in the process.
+
+    JSON requests reuse the latest figures while they are younger than
+    ``interval`` seconds. While dashboards are streaming, a background
+    thread recomputes each watched business every ``interval`` seconds,
+    or as soon as a checkout or purchase here calls ``notify``, and wakes
+    the streams only when the figures changed.
+    """
+
+    def __init__(self, interval=5, max_streams=4):
+        self.db = None
+        self.offset_hours = 0
+        self.interval = interval
+        self.max_streams = max_streams
+        self._cond = threading.Condition()
+        self._latest = {}
+        self._history = {}
+        self._dirty = set()
+        self._refreshing = set()
+        self._watchers = {}
+        self._thread = None
+
+    def configure(self, db, offset_hours, interval=None, max_streams=None):
+        self.db = db
+        self.offset_hours = offset_hours
+        if interval is not None:
+            self.interval = interval
+        if max_streams is not None:
+            self.max_streams = max_streams
+
+    def notify(self, business_id):
+        with self._cond:
+            self._dirty.add(business_id)
+            self._cond.notify_all()
+
+    def refresh(self, business_id):
+        with self._cond:
+            if business_id in self._refreshing:
+                # Someone is already computing it; share their result
+                self._cond.wait_for(lambda: business_id not in self._refreshing)
+                if business_id in self._latest:
+                    return self._latest[business_id][:2]
+            self._refreshing.add(business_id)
+            self._dirty.discard(business_id)
+        try:
+            values = compute(self.db, business_id, self.offset_hours)
+        finally:
+            with self._cond:
+                self._refreshing.discard(business_id)
+                self._cond.notify_all()
+        version = version_of(values)
+        with self._cond:
+            history = self._history.setdefault(business_id, OrderedDict())
+            history[version] = values
+            history.move_to_end(version)
+            while len(history) > HISTORY:
+                history.popitem(last=False)
+            self._latest[business_id] = (version, values, time.monotonic())
+            self._cond.notify_all()
+        return version, values
+
+    def current(self, business_id):
+        with self._cond:
+            latest = self._latest.get(business_id)
+            fresh = (latest is not None and business_id not in self._dirty
+                     and time.monotonic() - latest[2] < self.interval)
+        if fresh:
+            return latest[:2]
+        return self.refresh(business_id)
+
+    def since(self, business_id, version):
+        with self._cond:
+            return self._history.get(business_id, {}).get(version)
+
+    def watch(self, business_id):
+        """Register a stream; False when the process already serves max_streams."""
+        with self._cond:
+            if sum(self._watchers.values()) >= self.max_streams:
+                return False
+            self._watchers[business_id] = self._watchers.get(business_id, 0) + 1
+            self._dirty.add(business_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll, name='kpi-hub', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+            return True
+
+    def unwatch(self, business_id):
+        with self._cond:
+            self._watchers[business_id] -= 1
+            if not self._watchers[business_id]:
+                del self._watchers[business_id]
+
+    def wait(self, business_id, version, timeout):
+        """The latest (version, values) once it differs from ``version``, or None."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                latest = self._latest.get(business_id)
+                if latest is not None and latest[0] != version:
+                    return latest[:2]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _poll(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._watchers)
+                self._cond.wait_for(lambda: self._dirty & set(self._watchers), timeout=self.interval)
+                due = list(self._watchers)
+            for business_id in due:
+                try:
+                    self.refresh(business_id)
+                except PyMongoError as e:
+                    logger.warning('Could not refresh dashboard figures for %s: %s', business_id, e)
+
+
+kpi_hub = KpiHub()
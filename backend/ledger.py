@@ -0,0 +1,120 @@
+"""Append-only record of every change to products.current_quantity.
+
+Each movement is ``{business_id, product_id, change, kind, ref, at}`` with
+a signed ``change``; ``ref`` points at the sale or purchase behind it.
+``at`` is when the change was recorded, not the sale's own date, so sales
+uploaded late by an offline till never land before an existing snapshot.
+
+Snapshots hold every product's balance at a point in time. The balance
+on any date is the nearest earlier snapshot plus the movements since it.
+
+Sales and purchases write their movements in the same transaction as the
+stock change where the server supports transactions. Otherwise, and for
+product edits and deletes, the movement is a second write straight after
+the stock change; a crash between the two leaves a discrepancy that
+``audit-stock-ledger`` reports and ``--fix`` corrects.
+"""
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+
+KINDS = ('opening', 'sale', 'purchase', 'adjustment', 'import', 'removal', 'correction')
+# Snapshots stop short of now so writes still in flight are not skipped
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+
+def movements(business_id, changes, kind, ref=None, by=None):
+    """Movement documents for ``{product_id: signed change}``."""
+    at = datetime.utcnow()
+    docs = []
+    for product_id, change in changes.items():
+        if not change:
+            continue
+        doc = {"business_id": business_id, "product_id": product_id, "change": change,
+               "kind": kind, "ref": ref, "at": at}
+        if by:
+            doc["by"] = by
+        docs.append(doc)
+    return docs
+
+
+def record(db, business_id, changes, kind, ref=None, by=None, session=None):
+    docs = movements(business_id, changes, kind, ref, by)
+    if docs:
+        db.stock_movements.insert_many(docs, ordered=False, session=session)
+    return len(docs)
+
+
+def balances(db, business_id, at=None, product_ids=None):
+    """Quantity of each product as of ``at`` (default now), from the
+    nearest snapshot at or before it plus the movements after that.
+
+    Products with no snapshot entry and no movements are left out.
+    """
+    at = at or datetime.utcnow()
+    snapshot = db.stock_snapshots.find_one(
+        {"business_id": business_id, "at": {"$lte": at}}, sort=[("at", -1)]
+    )
+    quantities = {}
+    window = {"$lte": at}
+    if snapshot:
+        quantities = {ObjectId(pid): quantity for pid, quantity in snapshot['quantities'].items()}
+        window["$gt"] = snapshot['at']
+
+    match = {"business_id": business_id, "at": window}
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        match["product_id"] = {"$in": product_ids}
+        quantities = {pid: quantities[pid] for pid in product_ids if pid in quantities}
+    for row in db.stock_movements.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$product_id", "change": {"$sum": "$change"}}},
+    ]):
+        quantities[row['_id']] = quantities.get(row['_id'], 0) + row['change']
+    return quantities
+
+
+def snapshot(db, business_id, at=None):
+    at = at or datetime.utcnow() - SNAPSHOT_LAG
+    quantities = balances(db, business_id, at)
+    db.stock_snapshots.insert_one({
+        "business_id": business_id,
+        "at": at,
+        "quantities": {str(pid): quantity for pid, quantity in quantities.items()},
+    })
+    return len(quantities)
+
+
+def snapshot_all(db, at=None):
+    at = at or datetime.utcnow() - SNAPSHOT_LAG
+    return {business_id: snapshot(db, business_id, at) for business_id in db.products.distinct("business_id")}
+
+
+def discrepancies(db, business_id):
+    """{product_id: (ledger balance or None, current_quantity)} where they differ."""
+    ledger = balances(db, business_id)
+    found = {}
+    for product in db.products.find({"business_id": business_id}, {"current_quantity": 1}):
+        quantity = product.get('current_quantity', 0)
+        balance = ledger.get(product['_id'])
+        if (balance or 0) != quantity:
+            found[product['_id']] = (balance, quantity)
+    return found
+
+
+def true_up(db, business_id, kind='correction', by=None):
+    """Record movements that bring the ledger to the current quantities.
+
+    Products the ledger has never seen get an 'opening' movement instead.
+    Run it when nothing else writes stock for the business; a sale landing
+    between the two reads would be counted twice.
+    """
+    opening, corrections = {}, {}
+    for product_id, (balance, quantity) in discrepancies(db, business_id).items():
+        if balance is None:
+            opening[product_id] = quantity
+        else:
+            corrections[product_id] = quantity - balance
+    return (record(db, business_id, opening, 'opening', by=by)
+            + record(db, business_id, corrections, kind, by=by))
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+from pymongo import monitoring
+
+
+logger = logging.getLogger(__name__)
+
+# Request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Driver housekeeping, not work a request asked for
+IGNORED_COMMANDS = ('hello', 'isMaster', 'ismaster', 'endSessions', 'ping')
+
+
+class RequestCost:
+    __slots__ = ('commands', 'db_seconds', 'documents')
+
+    def __init__(self):
+        self.commands = 0
+        self.db_seconds = 0.0
+        self.documents = 0
+
+
+def _documents(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or ())
+    if reply.get('value') is not None:  # findAndModify
+        return 1
+    if isinstance(reply.get('values'), list):  # distinct
+        return len(reply['values'])
+    return 0
+
+
+class QueryListener(monitoring.CommandListener):
+    """Adds each Mongo command to the cost of the request on its thread.
+
+    Commands run outside a request (job workers, CLI commands) are not
+    counted.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.cost = RequestCost()
+        return self._local.cost
+
+    def end(self):
+        self._local.cost = None
+
+    def _record(self, event, documents=0):
+        cost = getattr(self._local, 'cost', None)
+        if cost is None or event.command_name in IGNORED_COMMANDS:
+            return
+        cost.commands += 1
+        cost.db_seconds += event.duration_micros / 1e6
+        cost.documents += documents
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, _documents(event.reply))
+
+    def failed(self, event):
+        self._record(event)
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'seconds', 'buckets', 'commands', 'db_seconds', 'documents', 'statuses')
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.commands = 0
+        self.db_seconds = 0.0
+        self.documents = 0
+        self.statuses = {}
+
+
+class RequestMetrics:
+    """Per-endpoint wall time and database cost for this process.
+
+    Each gunicorn worker keeps its own numbers, so a scrape of /metrics
+    sees only the worker that served it.
+    """
+
+    def __init__(self):
+        self.listener = QueryListener()
+        self.query_warning = 0
+        self.server_timing = False
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def init_app(self, app):
+        self.query_warning = app.config['QUERY_COUNT_WARNING']
+        self.server_timing = app.config['METRICS_SERVER_TIMING']
+        app.before_request(self._before)
+        app.after_request(self._after)
+
+    def _before(self):
+        g.request_started = time.perf_counter()
+        g.request_cost = self.listener.begin()
+
+    def _after(self, response):
+        started = g.get('request_started')
+        cost = g.get('request_cost')
+        if started is None or cost is None:
+            return response
+        endpoint, method, path = request.endpoint or 'unmatched', request.method, request.path
+        if self.server_timing:
+            app_ms = (time.perf_counter() - started) * 1000
+            response.headers['Server-Timing'] = (
+                f'db;dur={cost.db_seconds * 1000:.1f};desc="{cost.commands} queries", app;dur={app_ms:.1f}'
+            )
+
+        def finish():
+            # Streamed bodies query while they are sent, so close the books after that
+            self.listener.end()
+            self.observe(endpoint, method, response.status_code, time.perf_counter() - started, cost, path)
+
+        response.call_on_close(finish)
+        return response
+
+    def observe(self, endpoint, method, status, seconds, cost, path=None):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.requests += 1
+            stats.seconds += seconds
+            stats.buckets[bisect_left(BUCKETS, seconds)] += 1
+            stats.commands += cost.commands
+            stats.db_seconds += cost.db_seconds
+            stats.documents += cost.documents
+            key = (method, status)
+            stats.statuses[key] = stats.statuses.get(key, 0) + 1
+        if self.query_warning and cost.commands > self.query_warning:
+            logger.warning('%s %s (%s) ran %d Mongo commands in %.0fms', method, path, endpoint,
+                           cost.commands, seconds * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: {
+                "requests": stats.requests,
+                "seconds": stats.seconds,
+                "buckets": list(stats.buckets),
+                "commands": stats.commands,
+                "db_seconds": stats.db_seconds,
+                "documents": stats.documents,
+                "statuses": dict(stats.statuses),
+            } for endpoint, stats in self._endpoints.items()}
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in labels.items()) + '}'
+
+
+def render(snapshot, extra=()):
+    """Prometheus text exposition of a snapshot plus ``(name, type, value)`` series."""
+    lines = [
+        '# HELP stockflow_http_requests_total Requests served, by endpoint, method and status.',
+        '# TYPE stockflow_http_requests_total counter',
+    ]
+    for endpoint, stats in sorted(snapshot.items()):
+        for (method, status), count in sorted(stats['statuses'].items()):
+            lines.append(f'stockflow_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    lines += [
+        '# HELP stockflow_http_request_duration_seconds Wall time from routing to the last byte.',
+        '# TYPE stockflow_http_request_duration_seconds histogram',
+    ]
+    for endpoint, stats in sorted(snapshot.items()):
+        running = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), stats['buckets']):
+            running += count
+            lines.append(f'stockflow_http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {running}')
+        lines.append(f'stockflow_http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {stats["seconds"]:.6f}')
+        lines.append(f'stockflow_http_request_duration_seconds_count{_labels(endpoint=endpoint)} {stats["requests"]}')
+
+    for name, key, help_text, fmt in (
+        ('stockflow_db_commands_total', 'commands', 'Mongo commands sent while serving requests.', '{}'),
+        ('stockflow_db_duration_seconds_total', 'db_seconds', 'Time spent waiting on Mongo commands.', '{:.6f}'),
+        ('stockflow_db_documents_returned_total', 'documents', 'Documents returned by Mongo commands.', '{}'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for endpoint, stats in sorted(snapshot.items()):
+            lines.append(f'{name}{_labels(endpoint=endpoint)} {fmt.format(stats[key])}')
+
+    for name, kind, value in extra:
+        lines += [f'# TYPE {name} {kind}', f'{name} {value}']
+    return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
@@ -2,8 +2,9 @@ from datetime import datetime
 
 class Product:
     def __init__(self, name, description="", unit="piece", purchase_price=0.0, 
-                 selling_price=0.0, min_stock=0, max_stock=None, current_quantity=0):
+                 selling_price=0.0, min_stock=0, max_stock=None, current_quantity=0, sku=None):
         self.name = name
+        self.sku = sku
         self.description = description
         self.unit = unit
         self.purchase_price = float(purchase_price)
@@ -12,6 +13,7 @@ class Product:
         self.max_stock = int(max_stock) if max_stock is not None else None
         self.current_quantity = int(current_quantity)
         self.created_at = datetime.utcnow()
+        self.updated_at = self.created_at
 
     def to_dict(self):
         return {
@@ -23,7 +25,10 @@ class Product:
             "min_stock": self.min_stock,
             "max_stock": self.max_stock,
             "current_quantity": self.current_quantity,
-            "created_at": self.created_at
+            "sku": self.sku,
+            "is_low_stock": self.current_quantity < self.min_stock,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
         }
 
     @staticmethod
@@ -36,5 +41,6 @@ class Product:
             selling_price=data.get("selling_price", 0.0),
             min_stock=data.get("min_stock", 0),
             max_stock=data.get("max_stock"),
-            current_quantity=data.get("current_quantity", 0)
+            current_quantity=data.get("current_quantity", 0),
+            sku=data.get("sku")
         )
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""Read models for list pages.
+
+Each row class names the fields its template renders in ``PROJECTION``
+and keeps only those, in slots, so a page neither transfers nor holds the
+rest of the document (descriptions, timestamps, password hashes).
+"""
+
+
+class SupplierRow:
+    __slots__ = ('_id', 'name', 'contact_person', 'phone', 'email', 'address')
+    PROJECTION = {"name": 1, "contact_person": 1, "phone": 1, "email": 1, "address": 1}
+
+    def __init__(self, doc):
+        self._id = doc['_id']
+        self.name = doc.get('name', '')
+        self.contact_person = doc.get('contact_person', '')
+        self.phone = doc.get('phone', '')
+        self.email = doc.get('email', '')
+        self.address = doc.get('address', '')
+
+
+class SupplierOption:
+    # The supplier picker on the new purchase form
+    __slots__ = ('_id', 'name', 'contact_person')
+    PROJECTION = {"name": 1, "contact_person": 1}
+
+    def __init__(self, doc):
+        self._id = doc['_id']
+        self.name = doc.get('name', '')
+        self.contact_person = doc.get('contact_person', '')
+
+
+class UserRow:
+    __slots__ = ('_id', 'username', 'role', 'created_at')
+    PROJECTION = {"username": 1, "role": 1, "created_at": 1}
+
+    def __init__(self, doc):
+        self._id = doc['_id']
+        self.username = doc.get('username', '')
+        self.role = doc.get('role', 'cashier')
+        self.created_at = doc.get('created_at')
+
+
+def fetch(collection, row, query, sort=None):
+    cursor = collection.find(query, row.PROJECTION)
+    if sort:
+        cursor = cursor.sort(sort)
+    return [row(doc) for doc in cursor]
@@ -2,7 +2,7 @@ from datetime import datetime
 
 class Sale:
     def __init__(self, items, total_amount, payment_method="cash"):
-        self.items = items  # list of dicts: {'product_id': str, 'quantity': int, 'selling_price': float}
+        self.items = items  # list of dicts: {'product_id': str, 'product_name': str, 'unit': str, 'quantity': int, 'selling_price': float}
         self.total_amount = float(total_amount)
         self.payment_method = payment_method
         self.date = datetime.utcnow()
@@ -1,15 +1,15 @@
-from flask_bcrypt import generate_password_hash, check_password_hash
+from ..passwords import password_hasher
 from datetime import datetime
 
 class User:
     def __init__(self, username, password, role="cashier"):
         self.username = username
-        self.password_hash = generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
         self.role = role
         self.created_at = datetime.utcnow()
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
 
     def to_dict(self):
         return {
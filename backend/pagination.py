@@ -0,0 +1,133 @@
+import heapq
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from flask import request, render_template, stream_template
+
+
+class Page:
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+
+def page_args(default_per_page=25, max_per_page=100):
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        page = 1
+    try:
+        per_page = int(request.args.get('per_page', default_per_page))
+    except ValueError:
+        per_page = default_per_page
+    return page, min(max(1, per_page), max_per_page)
+
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
+def date_range_filter():
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD, both inclusive
+    date = {}
+    start = _parse_day(request.args.get('start'))
+    end = _parse_day(request.args.get('end'))
+    if start:
+        date["$gte"] = start
+    if end:
+        date["$lt"] = end + timedelta(days=1)
+    return {"date": date} if date else {}
+
+
+def encode_cursor(doc):
+    return f"{doc['date'].isoformat()}_{doc['_id']}"
+
+
+def decode_cursor(value):
+    try:
+        date, _id = value.rsplit('_', 1)
+        return datetime.fromisoformat(date), ObjectId(_id)
+    except (ValueError, InvalidId):
+        return None
+
+
+class KeysetPage:
+    """Newest-first page of a date-stamped collection, keyed on (date, _id).
+
+    Documents are pulled lazily while the template iterates, so neither
+    the page nor the history behind it is ever held as a list. A list of
+    collections (hot and archived sales) is read as one, merged in order.
+    """
+
+    def __init__(self, collection, query, per_page, before=None, projection=None, transform=None):
+        self.collection = collection
+        self.query = query
+        self.per_page = per_page
+        self.before = before
+        self.projection = projection
+        self.transform = transform
+        self.has_next = False
+        self._last = None
+
+    def _filter(self):
+        cursor = decode_cursor(self.before) if self.before else None
+        if cursor is None:
+            return self.query
+        date, _id = cursor
+        after = {"$or": [{"date": {"$lt": date}}, {"date": date, "_id": {"$lt": _id}}]}
+        return {"$and": [self.query, after]} if self.query else after
+
+    def _documents(self):
+        collections = self.collection if isinstance(self.collection, (list, tuple)) else [self.collection]
+        cursors = [
+            collection.find(self._filter(), self.projection)
+            .sort([("date", -1), ("_id", -1)])
+            .limit(self.per_page + 1)
+            for collection in collections
+        ]
+        if len(cursors) == 1:
+            yield from cursors[0]
+            return
+        previous = None
+        for doc in heapq.merge(*cursors, key=lambda doc: (doc['date'], doc['_id']), reverse=True):
+            # A sale caught mid-archive is in both collections for a moment
+            if doc['_id'] != previous:
+                previous = doc['_id']
+                yield doc
+
+    def __iter__(self):
+        for count, doc in enumerate(self._documents()):
+            if count == self.per_page:
+                self.has_next = True
+                break
+            self._last = doc
+            yield self.transform(doc) if self.transform else doc
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self._last) if self.has_next else None
+
+
+def render_listing(template_name, **context):
+    # ?stream=1 sends the page as it renders instead of buffering it
+    if request.args.get('stream') == '1':
+        return stream_template(template_name, **context)
+    return render_template(template_name, **context)
@@ -0,0 +1,99 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+
+logger = logging.getLogger(__name__)
+
+# bcrypt only ever looked at the first 72 bytes; newer releases refuse
+# longer input instead, so truncate to keep existing hashes verifiable.
+MAX_PASSWORD_BYTES = 72
+
+
+def _encode(password):
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password_hash, password):
+    try:
+        return bcrypt.checkpw(_encode(password), password_hash.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def cost(password_hash):
+    # "$2b$12$<salt+hash>" -> 12
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a bounded process pool.
+
+    At most ``workers`` hashes run at once per application process, so a
+    burst of logins queues for CPU instead of every request thread
+    competing for it. With ``workers=0`` hashing runs inline.
+    """
+
+    def __init__(self, rounds=12, workers=2, timeout=30):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def configure(self, rounds=None, workers=None):
+        if rounds is not None:
+            self.rounds = rounds
+        if workers is not None:
+            self.workers = workers
+
+    def _executor(self):
+        # A pool inherited through fork is unusable; start one per process.
+        # Spawned children also keep bcrypt clear of the parent's threads.
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        try:
+            return self._executor().submit(fn, *args).result(timeout=self.timeout)
+        except BrokenProcessPool:
+            logger.warning('Password hashing pool died; restarting it')
+            with self._lock:
+                self._pool = None
+            return fn(*args)
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check(self, password_hash, password):
+        return self._run(_check, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return cost(password_hash) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from . import archive
+from .jobs import task
+
+
+GRANULARITIES = ('hour', 'day')
+METRICS = ('units', 'revenue', 'cost', 'margin')
+
+
+def local_time(moment, offset_hours):
+    # Sales are stored in naive UTC; buckets are in the shop's local time.
+    return moment + timedelta(hours=offset_hours)
+
+
+def bucket_start(local, granularity):
+    if granularity == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _increments(sale, costs=None):
+    inc = {"sales": 1, "units": 0, "revenue": 0.0, "cost": 0.0, "margin": 0.0}
+    cashier = sale.get('cashier_id') or 'unknown'
+    inc[f"cashiers.{cashier}.sales"] = 1
+    for item in sale['items']:
+        units = item['quantity']
+        revenue = units * item['selling_price']
+        unit_cost = item.get('cost_price')
+        if unit_cost is None:
+            # Sales written before cost was snapshotted: current cost is the best we have
+            unit_cost = (costs or {}).get(str(item['product_id']), 0)
+        cost = units * unit_cost
+        values = {"units": units, "revenue": revenue, "cost": cost, "margin": revenue - cost}
+        for prefix in ("", f"products.{item['product_id']}.", f"cashiers.{cashier}."):
+            for metric, value in values.items():
+                inc[prefix + metric] = inc.get(prefix + metric, 0) + value
+    return inc
+
+
+def _upserts(sale, offset_hours, costs=None):
+    # Each bucket lists the sales folded into it, so a retried job skips them
+    inc = _increments(sale, costs)
+    local = local_time(sale['date'], offset_hours)
+    cashier = sale.get('cashier_id') or 'unknown'
+    return [
+        UpdateOne(
+            {"business_id": sale.get('business_id'), "granularity": granularity,
+             "bucket": bucket_start(local, granularity), "sale_ids": {"$ne": sale['_id']}},
+            {"$inc": inc, "$set": {f"cashiers.{cashier}.name": sale.get('cashier_name', 'Unknown')},
+             "$addToSet": {"sale_ids": sale['_id']}},
+            upsert=True
+        )
+        for granularity in GRANULARITIES
+    ]
+
+
+def _write(db, ops, attempts=2):
+    """Apply bucket upserts, ignoring sales a bucket already holds.
+
+    Such an upsert fails the unique bucket index, as does one that lost a
+    race to create a new bucket; those are tried again, and whatever
+    still collides was already applied.
+    """
+    for _ in range(attempts):
+        try:
+            db.sales_rollups.bulk_write(ops, ordered=False)
+            return
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            if any(error['code'] != 11000 for error in errors):
+                raise
+            ops = [ops[error['index']] for error in errors]
+
+
+def record_sale(db, sale, offset_hours):
+    """Fold one committed sale into its hourly and daily rollups (one round trip)."""
+    record_sales(db, [sale], offset_hours)
+
+
+@task('rollups.record_sales')
+def record_sales(db, sales, offset_hours):
+    ops = [op for sale in sales for op in _upserts(sale, offset_hours)]
+    if ops:
+        _write(db, ops)
+
+
+def rebuild(db, offset_hours, since=None, batch_size=1000):
+    """Recompute rollups from raw sales, hot and archived, from local day ``since`` onwards.
+
+    Buckets touched are deleted first, then sales are streamed and their
+    increments written in batches, so it is safe to re-run.
+    """
+    bucket_query, sales_query = {}, {}
+    if since is not None:
+        bucket_query = {"bucket": {"$gte": since}}
+        sales_query = {"date": {"$gte": since - timedelta(hours=offset_hours)}}
+    db.sales_rollups.delete_many(bucket_query)
+
+    costs = {str(p['_id']): p.get('purchase_price', 0) for p in db.products.find({}, {"purchase_price": 1})}
+    processed, ops = 0, []
+    for collection in archive.sales_collections(db, sales_query):
+        for sale in collection.find(sales_query).batch_size(batch_size):
+            ops.extend(_upserts(sale, offset_hours, costs))
+            processed += 1
+            if len(ops) >= batch_size:
+                _write(db, ops)
+                ops = []
+    if ops:
+        _write(db, ops)
+    return processed
+
+
+def report(db, business_id, start, end, granularity='day'):
+    """Totals, series, per-product and per-cashier figures for local [start, end)."""
+    totals = dict.fromkeys(('sales',) + METRICS, 0)
+    products, cashiers, series = {}, {}, []
+
+    for bucket in db.sales_rollups.find({
+        "business_id": business_id,
+        "granularity": granularity,
+        "bucket": {"$gte": start, "$lt": end}
+    }, {"sale_ids": 0}).sort("bucket", 1):
+        point = {"bucket": bucket['bucket'].isoformat(), "sales": bucket.get('sales', 0)}
+        totals['sales'] += point['sales']
+        for metric in METRICS:
+            point[metric] = bucket.get(metric, 0)
+            totals[metric] += point[metric]
+        series.append(point)
+
+        for product_id, figures in bucket.get('products', {}).items():
+            merged = products.setdefault(product_id, dict.fromkeys(METRICS, 0))
+            for metric in METRICS:
+                merged[metric] += figures.get(metric, 0)
+        for cashier_id, figures in bucket.get('cashiers', {}).items():
+            merged = cashiers.setdefault(cashier_id, dict.fromkeys(('sales',) + METRICS, 0))
+            merged['name'] = figures.get('name', merged.get('name', 'Unknown'))
+            for metric in ('sales',) + METRICS:
+                merged[metric] += figures.get(metric, 0)
+
+    return {"totals": totals, "series": series, "products": products, "cashiers": cashiers}
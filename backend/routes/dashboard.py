@@ -0,0 +1,72 @@
+import json
+import time
+
+from flask import Blueprint, request, session, current_app as app, jsonify, Response
+
+from ..kpis import kpi_hub, visible
+from ..tenancy import current_business_id
+
+bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
+
+# Comment line sent when nothing changed, so proxies keep the stream open
+HEARTBEAT_SECONDS = 15
+
+
+@bp.route('/kpis')
+def kpis():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    business_id = current_business_id()
+    role = session.get('role')
+    version, values = kpi_hub.current(business_id)
+    values = visible(values, role)
+    
+    # ?since=<version>: only what moved since the figures the client holds
+    since = request.args.get('since')
+    previous = kpi_hub.since(business_id, since) if since else None
+    if since == version:
+        return jsonify({'success': True, 'version': version, 'changed': False, 'kpis': {}})
+    if previous is not None:
+        previous = visible(previous, role)
+        changed = {k: v for k, v in values.items() if previous.get(k) != v}
+        return jsonify({
+            'success': True,
+            'version': version,
+            'changed': True,
+            'since': since,
+            'kpis': changed,
+            'deltas': {k: round(v - previous.get(k, 0), 2) for k, v in changed.items()}
+        })
+    return jsonify({'success': True, 'version': version, 'changed': True, 'kpis': values})
+
+
+@bp.route('/stream')
+def stream():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    business_id = current_business_id()
+    role = session.get('role')
+    # Each open stream holds a server thread; past the limit clients poll /dashboard/kpis
+    if not kpi_hub.watch(business_id):
+        return jsonify({'success': False, 'message': 'Too many live dashboards; poll /dashboard/kpis'}), 503
+    version = request.headers.get('Last-Event-ID')
+    deadline = time.monotonic() + app.config['KPI_STREAM_SECONDS']
+    
+    def events():
+        nonlocal version
+        yield 'retry: 5000\n\n'
+        # Streams end after a while and the browser reconnects with Last-Event-ID
+        while time.monotonic() < deadline:
+            latest = kpi_hub.wait(business_id, version, HEARTBEAT_SECONDS)
+            if latest is None:
+                yield ': keepalive\n\n'
+                continue
+            version, values = latest
+            yield f"id: {version}\nevent: kpis\ndata: {json.dumps(visible(values, role))}\n\n"
+    
+    response = Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: kpi_hub.unwatch(business_id))
+    return response
@@ -0,0 +1,52 @@
+from flask import Blueprint, request, session, current_app as app, jsonify, Response, stream_with_context
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+
+from .. import exports
+from ..catalog import catalog_cache
+from ..pagination import date_range_filter
+from ..tenancy import current_business_id
+
+bp = Blueprint('exports', __name__, url_prefix='/exports')
+
+FORMATS = {
+    'csv': ('text/csv', exports.csv_stream),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', exports.xlsx_stream),
+}
+
+
+@bp.route('/<kind>.<fmt>')
+def download(kind, fmt):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    if session.get('role') not in ['admin', 'super_admin']:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    if kind not in exports.EXPORTS or fmt not in FORMATS:
+        return jsonify({'success': False, 'message': 'Unknown export'}), 404
+    
+    # Branch admins export their own branch; the super admin may pick one
+    business_id = current_business_id()
+    if session.get('role') == 'super_admin' and request.args.get('business_id'):
+        try:
+            business_id = ObjectId(request.args['business_id'])
+        except InvalidId:
+            return jsonify({'success': False, 'message': 'Invalid business_id'}), 400
+    
+    query = {"business_id": business_id}
+    if exports.EXPORTS[kind][1]:
+        query.update(date_range_filter())
+    names = catalog_cache.names(app.db, business_id) if kind in ('sales', 'purchases') else {}
+    
+    mimetype, encode = FORMATS[fmt]
+    body = encode(exports.rows(app.db, kind, query, names))
+    filename = f"{kind}-{datetime.utcnow().strftime('%Y%m%d')}.{fmt}"
+    if fmt == 'csv' and request.args.get('gzip') == '1':
+        body = exports.gzip_stream(body)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,33 @@
+import hmac
+
+from flask import Blueprint, request, session, current_app as app, jsonify, Response
+
+from ..catalog import catalog_cache
+from ..jobs import job_queue
+from ..metrics import request_metrics, render
+
+bp = Blueprint('metrics', __name__)
+
+
+def _authorized():
+    token = app.config['METRICS_TOKEN']
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        return hmac.compare_digest(supplied.encode(), token.encode())
+    return session.get('role') == 'super_admin'
+
+
+@bp.route('/metrics')
+def metrics():
+    if not _authorized():
+        return jsonify({'success': False, 'message': 'Not authorized'}), 403
+
+    extra = [(f'stockflow_catalog_cache_{name}', 'gauge' if name == 'entries' else 'counter', value)
+             for name, value in catalog_cache.stats().items()]
+    jobs = job_queue.stats()
+    extra += [(f'stockflow_jobs_{name}', 'counter', jobs[name])
+              for name in ('submitted', 'completed', 'retried', 'failed')]
+    extra += [('stockflow_jobs_queue_depth', 'gauge', jobs['queue_depth']),
+              ('stockflow_jobs_active', 'gauge', jobs['active']),
+              ('stockflow_mongo_max_pool_size', 'gauge', app.config['MONGO_MAX_POOL_SIZE'])]
+    return Response(render(request_metrics.snapshot(), extra), mimetype='text/plain; version=0.0.4')
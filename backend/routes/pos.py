@@ -1,16 +1,68 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app as app, jsonify
 from bson.objectid import ObjectId
-from datetime import datetime
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timezone
+import time
+
+from ..stock import commit_sale, commit_sales, InsufficientStock
+from ..snapshots import line_products, snapshot_lines, resolve_product_names
+from .. import archive, inventory
+from ..catalog import catalog_cache
+from ..conditional import catalog_conditional
+from ..jobs import job_queue
+from ..kpis import kpi_hub
+from ..tenancy import current_business_id, scoped, stamp
 
 bp = Blueprint('pos', __name__, url_prefix='/pos')
 
+BATCH_LIMIT = 500
+
 @bp.route('/')
+@catalog_conditional('version', 'epoch')
 def index():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    products = list(app.db.products.find({"current_quantity": {"$gt": 0}}))  # Only in-stock
-    return render_template('pos.html', products=products)
+    # Only a first screen of in-stock products; the rest come from /pos/search
+    products = [p for p in catalog_cache.products(app.db, current_business_id())
+                if p.get('current_quantity', 0) > 0]
+    products.sort(key=lambda p: p['name'].lower())
+    return render_template('pos.html', products=products[:app.config['POS_INITIAL_PRODUCTS']])
+
+@bp.route('/search')
+def search():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    query = request.args.get('q', '').strip()
+    try:
+        limit = min(max(1, int(request.args.get('limit', 10))), 50)
+    except ValueError:
+        limit = 10
+    
+    started = time.perf_counter()
+    if not query:
+        products = []
+    elif app.config['SEARCH_BACKEND'] == 'text':
+        products = list(app.db.products.find(
+            scoped({"$text": {"$search": query}, "current_quantity": {"$gt": 0}}),
+            {"name": 1, "unit": 1, "selling_price": 1, "current_quantity": 1, "score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit))
+    else:
+        products = catalog_cache.search(app.db, query, limit, current_business_id(), in_stock=True)
+    
+    return jsonify({
+        'success': True,
+        'results': [{
+            'id': str(p['_id']),
+            'name': p['name'],
+            'unit': p.get('unit', 'piece'),
+            'selling_price': p.get('selling_price', 0),
+            'current_quantity': p.get('current_quantity', 0)
+        } for p in products],
+        'took_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
 
 @bp.route('/checkout', methods=['POST'])
 def checkout():
@@ -18,39 +70,165 @@ def checkout():
         return jsonify({'success': False, 'message': 'Login required'}), 401
     
     data = request.get_json()
-    items = data['items']
+    try:
+        items = _sale_items(data['items'])
+    except (KeyError, TypeError, ValueError, InvalidId) as e:
+        return jsonify({'success': False, 'message': f'Invalid sale: {e}'}), 400
     total_amount = sum(item['quantity'] * item['selling_price'] for item in items)
     payment_method = data.get('payment_method', 'cash')
+    idempotency_key = data.get('idempotency_key') or request.headers.get('Idempotency-Key')
     
+    # A retried request returns the sale the first attempt recorded
+    if idempotency_key:
+        existing = app.db.sales.find_one(scoped({"idempotency_key": idempotency_key}), {"_id": 1})
+        if existing:
+            return _checkout_response(existing['_id'])
     
-    for item in items:
-        product_id = ObjectId(item['product_id'])
-        result = app.db.products.update_one(
-            {"_id": product_id, "current_quantity": {"$gte": item['quantity']}},
-            {"$inc": {"current_quantity": -item['quantity']}}
-        )
-        if result.modified_count == 0:
-            product = app.db.products.find_one({"_id": product_id})
-            name = product['name'] if product else 'Unknown'
-            return jsonify({'success': False, 'message': f'Not enough stock for {name}'}), 400
-    
-    
-    sale = {
-        "items": items,
+    business_id = current_business_id()
+    products = line_products(app.db, items, inventory.VALUE_FIELDS, business_id)
+    sale = stamp({
+        "items": snapshot_lines(app.db, items, products, with_cost=True),
         "total_amount": total_amount,
         "payment_method": payment_method,
         "date": datetime.utcnow(),
         "cashier_id": session['user_id'],
         "cashier_name": session['username']
+    })
+    if idempotency_key:
+        sale['idempotency_key'] = idempotency_key
+    try:
+        sale_id = commit_sale(app.db, sale, products)
+    except InsufficientStock as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except DuplicateKeyError:
+        if not idempotency_key:
+            raise
+        existing = app.db.sales.find_one(scoped({"idempotency_key": idempotency_key}), {"_id": 1})
+        return _checkout_response(existing['_id'])
+    job_queue.submit('rollups.record_sales', sales=[sale], offset_hours=app.config['REPORT_UTC_OFFSET_HOURS'])
+    kpi_hub.notify(business_id)
+    return _checkout_response(sale_id)
+
+def _checkout_response(sale_id):
+    return jsonify({
+        'success': True,
+        'message': 'Sale completed!',
+        'redirect': url_for('pos.receipt', sale_id=str(sale_id))
+    })
+
+def _queued_date(value):
+    # Offline sales keep the time they were rung up; stored as naive UTC
+    if not value:
+        return datetime.utcnow()
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def _sale_items(raw):
+    items = [{
+        "product_id": str(ObjectId(item['product_id'])),
+        "quantity": int(item['quantity']),
+        "selling_price": float(item['selling_price'])
+    } for item in raw]
+    if not items or any(item['quantity'] <= 0 for item in items):
+        raise ValueError('items must be a non-empty list of positive quantities')
+    return items
+
+def _queued_sale(entry, products):
+    items = _sale_items(entry['items'])
+    return stamp({
+        "items": snapshot_lines(app.db, items, products, with_cost=True),
+        "total_amount": sum(item['quantity'] * item['selling_price'] for item in items),
+        "payment_method": entry.get('payment_method', 'cash'),
+        "date": _queued_date(entry.get('date')),
+        "cashier_id": session['user_id'],
+        "cashier_name": session['username'],
+        "idempotency_key": entry['idempotency_key']
+    })
+
+@bp.route('/checkout/batch', methods=['POST'])
+def checkout_batch():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    queued = (request.get_json(silent=True) or {}).get('sales')
+    if not isinstance(queued, list) or not queued:
+        return jsonify({'success': False, 'message': 'sales must be a non-empty list'}), 400
+    if len(queued) > BATCH_LIMIT:
+        return jsonify({'success': False, 'message': f'At most {BATCH_LIMIT} sales per request'}), 400
+    
+    keys = [entry.get('idempotency_key') if isinstance(entry, dict) else None for entry in queued]
+    recorded = {
+        s['idempotency_key']: s['_id'] for s in app.db.sales.find(
+            scoped({"idempotency_key": {"$in": [key for key in keys if isinstance(key, str)]}}),
+            {"idempotency_key": 1}
+        )
     }
-    result = app.db.sales.insert_one(sale)
-    sale_id = str(result.inserted_id)
     
-    receipt_url = url_for('pos.receipt', sale_id=sale_id)
+    results = [None] * len(queued)
+    first_seen, accepted = {}, []
+    for i, (entry, key) in enumerate(zip(queued, keys)):
+        if not isinstance(key, str) or not key:
+            results[i] = {'status': 'rejected', 'message': 'idempotency_key is required'}
+        elif key in recorded:
+            results[i] = {'status': 'duplicate', 'sale_id': str(recorded[key])}
+        elif key in first_seen:
+            continue
+        else:
+            first_seen[key] = i
+            accepted.append(i)
+    
+    business_id = current_business_id()
+    products = line_products(
+        app.db,
+        [item for i in accepted if isinstance(queued[i].get('items'), list) for item in queued[i]['items']
+         if isinstance(item, dict) and ObjectId.is_valid(item.get('product_id'))],
+        inventory.VALUE_FIELDS, business_id
+    )
+    sales, positions = [], []
+    for i in accepted:
+        try:
+            sales.append(_queued_sale(queued[i], products))
+            positions.append(i)
+        except (KeyError, TypeError, ValueError, InvalidId) as e:
+            results[i] = {'status': 'rejected', 'message': f'Invalid sale: {e}'}
+    
+    created, raced = [], []
+    for i, sale, outcome in zip(positions, sales, commit_sales(app.db, sales, products)):
+        if isinstance(outcome, ObjectId):
+            results[i] = {'status': 'created', 'sale_id': str(outcome)}
+            created.append(sale)
+        elif isinstance(outcome, DuplicateKeyError):
+            raced.append(i)
+        else:
+            results[i] = {'status': 'rejected', 'message': str(outcome)}
+    if created:
+        job_queue.submit('rollups.record_sales', sales=created, offset_hours=app.config['REPORT_UTC_OFFSET_HOURS'])
+        kpi_hub.notify(business_id)
+    
+    # Sent concurrently by another request after our lookup
+    if raced:
+        recorded = {
+            s['idempotency_key']: s['_id'] for s in app.db.sales.find(
+                scoped({"idempotency_key": {"$in": [keys[i] for i in raced]}}), {"idempotency_key": 1}
+            )
+        }
+        for i in raced:
+            results[i] = {'status': 'duplicate', 'sale_id': str(recorded.get(keys[i], ''))}
+    
+    for i, key in enumerate(keys):
+        if results[i] is None:
+            first = results[first_seen[key]]
+            results[i] = {**first, 'status': 'duplicate'} if first['status'] == 'created' else dict(first)
+        results[i]['idempotency_key'] = keys[i]
+    
     return jsonify({
         'success': True,
-        'message': 'Sale completed!',
-        'redirect': receipt_url
+        'created': sum(r['status'] == 'created' for r in results),
+        'duplicates': sum(r['status'] == 'duplicate' for r in results),
+        'rejected': sum(r['status'] == 'rejected' for r in results),
+        'results': results
     })
 
 @bp.route('/receipt/<sale_id>')
@@ -58,15 +236,14 @@ def receipt(sale_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    sale = app.db.sales.find_one({"_id": ObjectId(sale_id)})
+    sale = archive.find_sale(app.db, scoped({"_id": ObjectId(sale_id)}))
     if not sale:
         flash('Sale not found', 'danger')
         return redirect(url_for('pos.index'))
     
-   
+    
+    resolve_product_names(app.db, sale['items'])
     for item in sale['items']:
-        product = app.db.products.find_one({"_id": ObjectId(item['product_id'])})
-        item['product_name'] = product['name'] if product else 'Unknown'
         item['line_total'] = item['quantity'] * item['selling_price']
     
     return render_template('pos_receipt.html', sale=sale)
\ No newline at end of file
@@ -1,15 +1,46 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app as app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app as app, jsonify
 from ..models.product import Product  
+from .. import inventory, imports, ledger
+from ..catalog import catalog_cache, bump
+from ..conditional import catalog_conditional
+from ..tenancy import current_business_id, scoped, stamp
+from ..pagination import Page, page_args
 from bson.objectid import ObjectId  
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
 
 bp = Blueprint('products', __name__, url_prefix='/products')
 
+REORDER_FIELDS = {
+    "name": 1, "sku": 1, "unit": 1, "current_quantity": 1, "min_stock": 1, "max_stock": 1,
+    "purchase_price": 1, "last_cost_price": 1, "last_supplier_id": 1, "last_supplier_name": 1,
+}
+
+def _reorder_line(product):
+    # Top up to max_stock when one is set, otherwise back to min_stock
+    min_stock = product.get('min_stock', inventory.DEFAULT_MIN_STOCK)
+    target = max(product.get('max_stock') or 0, min_stock)
+    quantity = max(target - product.get('current_quantity', 0), 0)
+    unit_cost = product.get('last_cost_price') or product.get('purchase_price', 0)
+    return {
+        'id': str(product['_id']),
+        'name': product['name'],
+        'sku': product.get('sku'),
+        'unit': product.get('unit', 'piece'),
+        'current_quantity': product.get('current_quantity', 0),
+        'min_stock': min_stock,
+        'max_stock': product.get('max_stock'),
+        'reorder_quantity': quantity,
+        'estimated_cost': round(quantity * unit_cost, 2)
+    }
+
 @bp.route('/')
+@catalog_conditional('version', 'epoch')
 def index():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    products = list(app.db.products.find())
+    products = catalog_cache.products(app.db, current_business_id())
     return render_template('products.html', products=products)
 
 @bp.route('/add', methods=['POST'])
@@ -27,7 +58,12 @@ def add():
         max_stock=request.form.get('max_stock') or None,
         current_quantity=request.form.get('current_quantity', 0)
     )
-    app.db.products.insert_one(product.to_dict())
+    product_doc = stamp(product.to_dict())
+    app.db.products.insert_one(product_doc)
+    ledger.record(app.db, product_doc.get('business_id'), {product_doc['_id']: product_doc['current_quantity']},
+                  'opening', by=session.get('username'))
+    inventory.apply_delta(app.db, product_doc.get('business_id'), inventory.contribution(product_doc))
+    bump(app.db, product_doc.get('business_id'))
     flash('Product added successfully!', 'success')
     return redirect(url_for('products.index'))
 
@@ -36,7 +72,7 @@ def edit(product_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    product = app.db.products.find_one({"_id": ObjectId(product_id)})
+    product = app.db.products.find_one(scoped({"_id": ObjectId(product_id)}))
     if not product:
         flash('Product not found', 'danger')
         return redirect(url_for('products.index'))
@@ -50,9 +86,22 @@ def edit(product_id):
             "selling_price": float(request.form['selling_price']),
             "min_stock": int(request.form['min_stock']),
             "max_stock": int(request.form.get('max_stock')) if request.form.get('max_stock') else None,
-            "current_quantity": int(request.form.get('current_quantity', product['current_quantity']))
+            "current_quantity": int(request.form.get('current_quantity', product['current_quantity'])),
+            "updated_at": datetime.utcnow()
         }
-        app.db.products.update_one({"_id": ObjectId(product_id)}, {"$set": updated})
+        updated['is_low_stock'] = updated['current_quantity'] < updated['min_stock']
+        # The document as the update found it, so a sale since the read above is not counted twice
+        product = app.db.products.find_one_and_update(
+            scoped({"_id": ObjectId(product_id)}), {"$set": updated}, return_document=ReturnDocument.BEFORE
+        )
+        if not product:
+            flash('Product not found', 'danger')
+            return redirect(url_for('products.index'))
+        ledger.record(app.db, product.get('business_id'),
+                      {product['_id']: updated['current_quantity'] - product.get('current_quantity', 0)},
+                      'adjustment', by=session.get('username'))
+        inventory.apply_delta(app.db, product.get('business_id'), inventory.difference(product, {**product, **updated}))
+        bump(app.db, product.get('business_id'))
         flash('Product updated successfully!', 'success')
         return redirect(url_for('products.index'))
     
@@ -63,6 +112,124 @@ def delete(product_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    app.db.products.delete_one({"_id": ObjectId(product_id)})
+    product = app.db.products.find_one_and_delete(scoped({"_id": ObjectId(product_id)}))
+    if product:
+        ledger.record(app.db, product.get('business_id'), {product['_id']: -product.get('current_quantity', 0)},
+                      'removal', by=session.get('username'))
+        inventory.apply_delta(app.db, product.get('business_id'), inventory.contribution(product, sign=-1))
+        bump(app.db, product.get('business_id'), deleted=True)
     flash('Product deleted', 'info')
-    return redirect(url_for('products.index'))
\ No newline at end of file
+    return redirect(url_for('products.index'))
+
+@bp.route('/import', methods=['POST'])
+def import_products():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV or JSON file to import', 'danger')
+        return redirect(url_for('products.index'))
+    
+    try:
+        result = imports.import_products(app.db, imports.parse(upload.stream, upload.filename), current_business_id())
+    except imports.ImportFormatError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('products.index'))
+    
+    flash(f"Imported {result['rows']} rows: {result['inserted']} added, {result['updated']} updated, "
+          f"{len(result['errors'])} skipped", 'success' if not result['errors'] else 'warning')
+    for error in result['errors'][:10]:
+        flash(f"Row {error['row']}: {error['message']}", 'danger')
+    if len(result['errors']) > 10:
+        flash(f"...and {len(result['errors']) - 10} more rows with errors", 'danger')
+    return redirect(url_for('products.index'))
+
+
+@bp.route('/low-stock')
+def low_stock():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    page, per_page = page_args(default_per_page=50, max_per_page=200)
+    query = scoped({"is_low_stock": True})
+    total = app.db.products.count_documents(query)
+    products = app.db.products.find(query, REORDER_FIELDS).sort("name", 1).skip((page - 1) * per_page).limit(per_page)
+    result = Page([_reorder_line(p) for p in products], page, per_page, total)
+    return jsonify({
+        'success': True,
+        'items': result.items,
+        'page': result.page,
+        'per_page': result.per_page,
+        'pages': result.pages,
+        'total': result.total
+    })
+
+@bp.route('/reorder-queue')
+def reorder_queue():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    groups = app.db.products.aggregate([
+        {"$match": scoped({"is_low_stock": True})},
+        {"$project": REORDER_FIELDS},
+        {"$sort": {"name": 1}},
+        {"$group": {
+            "_id": "$last_supplier_id",
+            "supplier_name": {"$first": "$last_supplier_name"},
+            "products": {"$push": "$$ROOT"}
+        }},
+    ])
+    suppliers = []
+    for group in groups:
+        lines = [_reorder_line(p) for p in group['products']]
+        suppliers.append({
+            'supplier_id': str(group['_id']) if group['_id'] else None,
+            'supplier_name': group.get('supplier_name') or 'No purchases yet',
+            'items': lines,
+            'estimated_cost': round(sum(line['estimated_cost'] for line in lines), 2)
+        })
+    # Products never bought from anyone go last
+    suppliers.sort(key=lambda g: (g['supplier_id'] is None, g['supplier_name'].lower()))
+    return jsonify({'success': True, 'suppliers': suppliers})
+
+@bp.route('/<product_id>/movements')
+def movements(product_id):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    if not ObjectId.is_valid(product_id):
+        return jsonify({'success': False, 'message': 'Product not found'}), 404
+    product = app.db.products.find_one(scoped({"_id": ObjectId(product_id)}), {"name": 1, "current_quantity": 1})
+    if not product:
+        return jsonify({'success': False, 'message': 'Product not found'}), 404
+    
+    # ?date=YYYY-MM-DD: stock at the end of that local day; default now
+    at = datetime.utcnow()
+    if request.args.get('date'):
+        try:
+            day = datetime.strptime(request.args['date'], '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'success': False, 'message': 'date must be YYYY-MM-DD'}), 400
+        at = min(at, day + timedelta(days=1, hours=-app.config['REPORT_UTC_OFFSET_HOURS']))
+    _, limit = page_args(default_per_page=50, max_per_page=200)
+    
+    business_id = current_business_id()
+    balance = ledger.balances(app.db, business_id, at, [product['_id']]).get(product['_id'], 0)
+    history = app.db.stock_movements.find(
+        {"product_id": product['_id'], "at": {"$lte": at}},
+        {"change": 1, "kind": 1, "ref": 1, "by": 1, "at": 1}
+    ).sort("at", -1).limit(limit)
+    return jsonify({
+        'success': True,
+        'product': {'id': product_id, 'name': product['name'], 'current_quantity': product.get('current_quantity', 0)},
+        'at': at.isoformat(),
+        'quantity': balance,
+        'movements': [{
+            'change': m['change'],
+            'kind': m['kind'],
+            'ref': str(m['ref']) if m.get('ref') else None,
+            'by': m.get('by'),
+            'at': m['at'].isoformat()
+        } for m in history]
+    })
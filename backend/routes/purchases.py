@@ -2,6 +2,15 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from bson.objectid import ObjectId
 from datetime import datetime
 
+from ..snapshots import line_products, snapshot_lines, resolve_product_names
+from .. import inventory
+from ..catalog import catalog_cache
+from ..stock import receive_stock
+from ..kpis import kpi_hub
+from ..models.rows import SupplierOption, fetch
+from ..tenancy import current_business_id, scoped, stamp
+from ..pagination import KeysetPage, page_args, date_range_filter, render_listing
+
 bp = Blueprint('purchases', __name__, url_prefix='/purchases')
 
 @bp.route('/')
@@ -9,17 +18,19 @@ def index():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    purchases = list(app.db.purchases.find().sort("date", -1))
-    suppliers = {str(s['_id']): s['name'] for s in app.db.suppliers.find()}
-    products = {str(p['_id']): p['name'] for p in app.db.products.find()}
-    
+    _, per_page = page_args(default_per_page=50, max_per_page=500)
+    suppliers = {str(s['_id']): s['name'] for s in app.db.suppliers.find(scoped(), {"name": 1})}
+    products = catalog_cache.names(app.db, current_business_id())
     
-    for purchase in purchases:
-        purchase['supplier_name'] = suppliers.get(str(purchase['supplier_id']), 'Unknown')
+    def decorate(purchase):
+        purchase.setdefault('supplier_name', suppliers.get(str(purchase['supplier_id']), 'Unknown'))
         for item in purchase['items']:
-            item['product_name'] = products.get(item['product_id'], 'Unknown')
+            item.setdefault('product_name', products.get(item['product_id'], 'Unknown'))
+        return purchase
     
-    return render_template('purchases.html', purchases=purchases)
+    purchases = KeysetPage(app.db.purchases, scoped(date_range_filter()), per_page,
+                           before=request.args.get('before'), transform=decorate)
+    return render_listing('purchases.html', purchases=purchases)
 
 @bp.route('/add', methods=['POST'])
 def add():
@@ -30,27 +41,26 @@ def add():
     supplier_id = data['supplier_id']
     items = data['items']
     total_cost = sum(item['quantity'] * item['cost_price'] for item in items)
+    business_id = current_business_id()
+    products = line_products(app.db, items, inventory.VALUE_FIELDS, business_id)
     
+    supplier = app.db.suppliers.find_one(scoped({"_id": ObjectId(supplier_id)}), {"name": 1})
+    purchase_id = ObjectId()
+    receive_stock(app.db, items, business_id, products, supplier, purchase_id)
+    kpi_hub.notify(business_id)
     
-    for item in items:
-        product_id = ObjectId(item['product_id'])
-        app.db.products.update_one(
-            {"_id": product_id},
-            {"$inc": {"current_quantity": item['quantity']}}
-        )
-    
-    
-    purchase = {
+    purchase = stamp({
+        "_id": purchase_id,
         "supplier_id": ObjectId(supplier_id),
-        "items": items,
+        "supplier_name": supplier['name'] if supplier else 'Unknown',
+        "items": snapshot_lines(app.db, items, products),
         "total_cost": total_cost,
         "date": datetime.utcnow()
-    }
-    result = app.db.purchases.insert_one(purchase)
-    purchase_id = str(result.inserted_id)
+    })
+    app.db.purchases.insert_one(purchase)
     
     
-    receipt_url = url_for('purchases.receipt', purchase_id=purchase_id)
+    receipt_url = url_for('purchases.receipt', purchase_id=str(purchase_id))
     return jsonify({
         'success': True,
         'message': 'Purchase recorded successfully!',
@@ -62,8 +72,8 @@ def new():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    suppliers = list(app.db.suppliers.find())
-    products = list(app.db.products.find())
+    suppliers = fetch(app.db.suppliers, SupplierOption, scoped())
+    products = catalog_cache.products(app.db, current_business_id())
     return render_template('purchase_new.html', suppliers=suppliers, products=products)
 
 @bp.route('/receipt/<purchase_id>')
@@ -71,18 +81,18 @@ def receipt(purchase_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    purchase = app.db.purchases.find_one({"_id": ObjectId(purchase_id)})
+    purchase = app.db.purchases.find_one(scoped({"_id": ObjectId(purchase_id)}))
     if not purchase:
         flash('Purchase not found', 'danger')
         return redirect(url_for('purchases.index'))
     
-    supplier = app.db.suppliers.find_one({"_id": purchase['supplier_id']})
-    supplier_name = supplier['name'] if supplier else 'Unknown'
-    
+    supplier_name = purchase.get('supplier_name')
+    if supplier_name is None:
+        supplier = app.db.suppliers.find_one({"_id": purchase['supplier_id']}, {"name": 1})
+        supplier_name = supplier['name'] if supplier else 'Unknown'
     
+    resolve_product_names(app.db, purchase['items'])
     for item in purchase['items']:
-        product = app.db.products.find_one({"_id": ObjectId(item['product_id'])})
-        item['product_name'] = product['name'] if product else 'Unknown'
         item['line_total'] = item['quantity'] * item['cost_price']
     
     return render_template('purchase_receipt.html',
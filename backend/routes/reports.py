@@ -0,0 +1,69 @@
+from flask import Blueprint, request, session, current_app as app, jsonify
+from datetime import datetime, timedelta
+
+from .. import rollups
+from ..catalog import catalog_cache
+from ..tenancy import current_business_id
+
+bp = Blueprint('reports', __name__, url_prefix='/reports')
+
+MAX_HOURLY_DAYS = 31
+
+
+def _report_range(name, offset_hours):
+    today = rollups.bucket_start(rollups.local_time(datetime.utcnow(), offset_hours), 'day')
+    tomorrow = today + timedelta(days=1)
+    if name == 'today':
+        return today, tomorrow
+    if name == 'week':
+        return today - timedelta(days=6), tomorrow
+    if name == 'month':
+        return today.replace(day=1), tomorrow
+    if name == 'custom':
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d')
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1)
+        if end <= start:
+            raise ValueError('end must not be before start')
+        return start, end
+    raise ValueError(f'unknown range {name!r}')
+
+
+@bp.route('/sales')
+def sales():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    if session.get('role') not in ['admin', 'super_admin']:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    range_name = request.args.get('range', 'today')
+    granularity = request.args.get('granularity', 'day')
+    try:
+        start, end = _report_range(range_name, app.config['REPORT_UTC_OFFSET_HOURS'])
+    except (KeyError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Invalid range: {e}'}), 400
+    if granularity not in rollups.GRANULARITIES:
+        return jsonify({'success': False, 'message': 'granularity must be hour or day'}), 400
+    if granularity == 'hour' and end - start > timedelta(days=MAX_HOURLY_DAYS):
+        return jsonify({'success': False, 'message': f'Hourly reports cover at most {MAX_HOURLY_DAYS} days'}), 400
+    
+    business_id = current_business_id()
+    result = rollups.report(app.db, business_id, start, end, granularity)
+    names = catalog_cache.names(app.db, business_id)
+    
+    products = [
+        {'product_id': product_id, 'name': names.get(product_id, 'Unknown'), **figures}
+        for product_id, figures in result['products'].items()
+    ]
+    products.sort(key=lambda p: p['revenue'], reverse=True)
+    cashiers = [{'cashier_id': cashier_id, **figures} for cashier_id, figures in result['cashiers'].items()]
+    cashiers.sort(key=lambda c: c['revenue'], reverse=True)
+    
+    return jsonify({
+        'success': True,
+        'range': {'name': range_name, 'start': start.isoformat(), 'end': end.isoformat()},
+        'granularity': granularity,
+        'totals': result['totals'],
+        'series': result['series'],
+        'products': products,
+        'cashiers': cashiers
+    })
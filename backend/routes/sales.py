@@ -1,7 +1,12 @@
-from flask import Blueprint, render_template, redirect, url_for, session, current_app as app
+from flask import Blueprint, redirect, url_for, session, request, current_app as app
 from bson.objectid import ObjectId
 from datetime import datetime
 
+from .. import archive
+from ..catalog import catalog_cache
+from ..tenancy import current_business_id, scoped
+from ..pagination import KeysetPage, page_args, date_range_filter, render_listing
+
 bp = Blueprint('sales', __name__, url_prefix='/sales')
 
 @bp.route('/')
@@ -9,15 +14,16 @@ def index():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-   
-    sales = list(app.db.sales.find().sort("date", -1))
-    
-    
-    products = {str(p['_id']): p['name'] for p in app.db.products.find()}
+    _, per_page = page_args(default_per_page=50, max_per_page=500)
+    products = catalog_cache.names(app.db, current_business_id())
     
-    for sale in sales:
+    def decorate(sale):
         for item in sale['items']:
-            item['product_name'] = products.get(item['product_id'], 'Unknown')
+            item.setdefault('product_name', products.get(item['product_id'], 'Unknown'))
             item['line_total'] = item['quantity'] * item['selling_price']
+        return sale
     
-    return render_template('sales.html', sales=sales)  
\ No newline at end of file
+    query = scoped(date_range_filter())
+    sales = KeysetPage(archive.sales_collections(app.db, query), query, per_page,
+                       before=request.args.get('before'), transform=decorate)
+    return render_listing('sales.html', sales=sales)
@@ -1,16 +1,21 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app as app, jsonify
 from ..models.supplier import Supplier
+from ..models.rows import SupplierRow, fetch
 from bson.objectid import ObjectId
+from ..tenancy import current_business_id, scoped, stamp
+from ..catalog import bump_suppliers
+from ..conditional import catalog_conditional
 from datetime import datetime  
 
 bp = Blueprint('suppliers', __name__, url_prefix='/suppliers')
 
 @bp.route('/')
+@catalog_conditional('suppliers')
 def index():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    suppliers = list(app.db.suppliers.find())
+    suppliers = fetch(app.db.suppliers, SupplierRow, scoped())
     return render_template('suppliers.html', suppliers=suppliers)
 
 
@@ -29,7 +34,8 @@ def add():
             email=data.get('email', ''),
             address=data.get('address', '')
         )
-        result = app.db.suppliers.insert_one(supplier.to_dict())
+        result = app.db.suppliers.insert_one(stamp(supplier.to_dict()))
+        bump_suppliers(app.db, current_business_id())
         return jsonify({
             'success': True,
             'message': 'Supplier added successfully!',
@@ -44,7 +50,8 @@ def add():
         email=request.form.get('email', ''),
         address=request.form.get('address', '')
     )
-    app.db.suppliers.insert_one(supplier.to_dict())
+    app.db.suppliers.insert_one(stamp(supplier.to_dict()))
+    bump_suppliers(app.db, current_business_id())
     flash('Supplier added successfully!', 'success')
     return redirect(url_for('suppliers.index'))
 
@@ -53,7 +60,7 @@ def edit(supplier_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    supplier = app.db.suppliers.find_one({"_id": ObjectId(supplier_id)})
+    supplier = app.db.suppliers.find_one(scoped({"_id": ObjectId(supplier_id)}))
     if not supplier:
         flash('Supplier not found', 'danger')
         return redirect(url_for('suppliers.index'))
@@ -66,7 +73,8 @@ def edit(supplier_id):
             "email": request.form.get('email', ''),
             "address": request.form.get('address', '')
         }
-        app.db.suppliers.update_one({"_id": ObjectId(supplier_id)}, {"$set": updated})
+        app.db.suppliers.update_one(scoped({"_id": ObjectId(supplier_id)}), {"$set": updated})
+        bump_suppliers(app.db, current_business_id())
         flash('Supplier updated successfully!', 'success')
         return redirect(url_for('suppliers.index'))
     
@@ -77,6 +85,7 @@ def delete(supplier_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    app.db.suppliers.delete_one({"_id": ObjectId(supplier_id)})
+    app.db.suppliers.delete_one(scoped({"_id": ObjectId(supplier_id)}))
+    bump_suppliers(app.db, current_business_id())
     flash('Supplier deleted', 'info')
     return redirect(url_for('suppliers.index'))
\ No newline at end of file
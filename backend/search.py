@@ -0,0 +1,96 @@
+import heapq
+import threading
+from collections import defaultdict
+
+
+def normalise(text):
+    return ' '.join((text or '').lower().split())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def score(query, name, description):
+    if name == query:
+        return 100
+    if name.startswith(query):
+        return 80
+    if any(word.startswith(query) for word in name.split()):
+        return 60
+    if query in name:
+        return 40
+    if query in description:
+        return 20
+    return 0
+
+
+class SearchIndex:
+    """Trigram index over product name and description.
+
+    Queries of three characters or more only look at products sharing all
+    of the query's trigrams; shorter queries scan the (already normalised)
+    names. Results are ranked exact > prefix > word prefix > substring in
+    name > substring in description, then alphabetically.
+    """
+
+    def __init__(self, products=()):
+        self._lock = threading.Lock()
+        self._grams = defaultdict(set)
+        self._docs = {}
+        for product in products:
+            self._add(product)
+
+    def _add(self, product):
+        name = normalise(product.get('name'))
+        description = normalise(product.get('description'))
+        grams = trigrams(name) | trigrams(description)
+        self._docs[product['_id']] = (name, description, grams)
+        for gram in grams:
+            self._grams[gram].add(product['_id'])
+
+    def _remove(self, product_id):
+        name, description, grams = self._docs.pop(product_id)
+        for gram in grams:
+            ids = self._grams[gram]
+            ids.discard(product_id)
+            if not ids:
+                del self._grams[gram]
+
+    def copy(self):
+        # Cheaper than re-indexing: names and trigrams are reused as they are
+        index = SearchIndex()
+        with self._lock:
+            index._docs = dict(self._docs)
+            index._grams = defaultdict(set, {gram: set(ids) for gram, ids in self._grams.items()})
+        return index
+
+    def update(self, products):
+        with self._lock:
+            for product in products:
+                indexed = self._docs.get(product['_id'])
+                if indexed and indexed[:2] == (normalise(product.get('name')), normalise(product.get('description'))):
+                    continue
+                if indexed:
+                    self._remove(product['_id'])
+                self._add(product)
+
+    def search(self, query, limit=10, include=None):
+        query = normalise(query)
+        if not query:
+            return []
+        with self._lock:
+            if len(query) >= 3:
+                postings = sorted((self._grams.get(gram, set()) for gram in trigrams(query)), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+            else:
+                candidates = list(self._docs)
+            ranked = []
+            for product_id in candidates:
+                if include is not None and not include(product_id):
+                    continue
+                name, description, _ = self._docs[product_id]
+                rank = score(query, name, description)
+                if rank:
+                    ranked.append((-rank, name, product_id))
+        return [product_id for _, _, product_id in heapq.nsmallest(limit, ranked)]
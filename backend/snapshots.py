@@ -0,0 +1,50 @@
+from bson.objectid import ObjectId
+
+
+def _product_ids(items):
+    return list({ObjectId(item['product_id']) for item in items})
+
+
+def line_products(db, items, fields=None, business_id=None):
+    projection = {"name": 1, "unit": 1}
+    projection.update(fields or {})
+    return {
+        p['_id']: p for p in db.products.find(
+            {"_id": {"$in": _product_ids(items)}, "business_id": business_id},
+            projection
+        )
+    }
+
+
+def snapshot_lines(db, items, products=None, with_cost=False):
+    # Record name and unit on each line when the document is written, so
+    # receipts never go back to the products collection and stay accurate
+    # after a product is renamed. Sale lines also keep the unit cost at the
+    # time of sale (with_cost) for margin reporting; ``products`` must then
+    # include purchase_price.
+    if products is None:
+        products = line_products(db, items, {"purchase_price": 1} if with_cost else None)
+    for item in items:
+        product = products.get(ObjectId(item['product_id']))
+        item['product_name'] = product['name'] if product else 'Unknown'
+        item['unit'] = product.get('unit', 'piece') if product else 'piece'
+        if with_cost:
+            item['cost_price'] = product.get('purchase_price', 0) if product else 0
+    return items
+
+
+def resolve_product_names(db, items):
+    # Documents written before line snapshots existed: fill the gaps with
+    # a single projected $in lookup.
+    missing = [item for item in items if 'product_name' not in item]
+    if not missing:
+        return items
+    names = {
+        str(p['_id']): p['name'] for p in db.products.find(
+            {"_id": {"$in": _product_ids(missing)}},
+            {"name": 1}
+        )
+    }
+    for item in missing:
+        item['product_name'] = names.get(str(item['product_id']), 'Unknown')
+    return items
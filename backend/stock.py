@@ -0,0 +1,323 @@
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+
+from . import catalog, inventory, ledger
+from .snapshots import line_products
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_name):
+        super().__init__(f'Not enough stock for {product_name}')
+        self.product_name = product_name
+
+
+class _Shortfall(Exception):
+    pass
+
+
+_transaction_support = {}
+
+
+def supports_transactions(client):
+    # Multi-document transactions need a replica set or mongos; a bare
+    # mongod (local development) has to fall back to compensation.
+    key = id(client)
+    if key not in _transaction_support:
+        try:
+            hello = client.admin.command('hello')
+            _transaction_support[key] = bool(hello.get('setName') or hello.get('msg') == 'isdbgrid')
+        except PyMongoError:
+            _transaction_support[key] = False
+    return _transaction_support[key]
+
+
+def merge_quantities(items):
+    quantities = {}
+    for item in items:
+        product_id = ObjectId(item['product_id'])
+        quantities[product_id] = quantities.get(product_id, 0) + int(item['quantity'])
+    return quantities
+
+
+def _stock_change(quantity):
+    # Pipeline $set fields for a change of ``quantity`` units. The
+    # low-stock flag is recomputed in the same write, from the same values.
+    after = {"$add": [{"$ifNull": ["$current_quantity", 0]}, quantity]}
+    return {
+        "current_quantity": after,
+        "is_low_stock": {"$lt": [after, {"$ifNull": ["$min_stock", inventory.DEFAULT_MIN_STOCK]}]},
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def _decrement_ops(quantities, business_id, token=None):
+    ops = []
+    for product_id, quantity in quantities.items():
+        fields = _stock_change(-quantity)
+        if token is not None:
+            fields["pending_checkouts"] = {"$concatArrays": [{"$ifNull": ["$pending_checkouts", []]}, [token]]}
+        ops.append(UpdateOne(
+            {"_id": product_id, "business_id": business_id, "current_quantity": {"$gte": quantity}},
+            [{"$set": fields}]
+        ))
+    return ops
+
+
+def merge_receipts(items):
+    receipts = {}
+    for item in items:
+        product_id = ObjectId(item['product_id'])
+        quantity, value = receipts.get(product_id, (0, 0.0))
+        receipts[product_id] = (quantity + int(item['quantity']), value + int(item['quantity']) * float(item['cost_price']))
+    return receipts
+
+
+def _receive_ops(receipts, business_id, supplier=None):
+    # Pipeline updates, so the moving average is computed from the stored
+    # quantity and cost at write time: (qty*avg + q*cost) / (qty + q).
+    ops = []
+    for product_id, (quantity, value) in receipts.items():
+        if quantity <= 0:
+            continue
+        on_hand = {"$max": [{"$ifNull": ["$current_quantity", 0]}, 0]}
+        fields = {
+            **_stock_change(quantity),
+            "purchase_price": {"$divide": [
+                {"$add": [{"$multiply": [on_hand, {"$ifNull": ["$purchase_price", 0]}]}, value]},
+                {"$add": [on_hand, quantity]}
+            ]},
+        }
+        if supplier:
+            fields["last_supplier_id"] = {"$literal": supplier['_id']}
+            fields["last_supplier_name"] = {"$literal": supplier['name']}
+            fields["last_cost_price"] = value / quantity
+        ops.append(UpdateOne({"_id": product_id, "business_id": business_id}, [{"$set": fields}]))
+    return ops
+
+
+def receive_stock(db, items, business_id, products=None, supplier=None, purchase_id=None):
+    """Add a delivery's lines to stock in one unordered bulk write.
+
+    Each product's purchase_price becomes the weighted average of the stock
+    on hand and the units received, and ``supplier`` (_id and name) is
+    recorded as where it was last bought. ``products`` is the pre-delivery
+    snapshot (inventory.VALUE_FIELDS) used to move the inventory summary.
+    The receipts of products the business owns go to the stock ledger
+    against ``purchase_id``, in the same transaction where the server has
+    them. Returns the number of products updated.
+    """
+    receipts = merge_receipts(items)
+    ops = _receive_ops(receipts, business_id, supplier)
+    if not ops:
+        return 0
+    if products is None:
+        products = line_products(db, items, inventory.VALUE_FIELDS, business_id)
+    # Lines for other businesses' or deleted products change no stock
+    received = {pid: quantity for pid, (quantity, _) in receipts.items() if quantity > 0 and pid in products}
+
+    def write(session=None):
+        result = db.products.bulk_write(ops, ordered=False, session=session)
+        ledger.record(db, business_id, received, 'purchase', purchase_id, session=session)
+        return result
+
+    client = db.client
+    if supports_transactions(client):
+        with client.start_session() as session:
+            result = session.with_transaction(write)
+    else:
+        result = write()
+    inventory.apply_deltas(db, inventory.receipt_deltas(products, receipts))
+    inventory.refresh_low_stock_count(db, business_id)
+    catalog.bump(db, business_id)
+    return result.matched_count
+
+
+def _short_product_name(db, quantities, business_id):
+    products = {
+        p['_id']: p for p in db.products.find(
+            {"_id": {"$in": list(quantities)}, "business_id": business_id},
+            {"name": 1, "current_quantity": 1}
+        )
+    }
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            return 'Unknown'
+        if product.get('current_quantity', 0) < quantity:
+            return product['name']
+    return 'Unknown'
+
+
+def _compensate_ops(quantities, token):
+    return [
+        UpdateOne(
+            {"_id": product_id, "pending_checkouts": token},
+            [{"$set": {
+                **_stock_change(quantity),
+                "pending_checkouts": {"$filter": {"input": "$pending_checkouts", "cond": {"$ne": ["$$this", token]}}}
+            }}]
+        )
+        for product_id, quantity in quantities.items()
+    ]
+
+
+def _clear_pending(db, product_ids):
+    # Drop the array once its last token is gone; a checkout that tagged the
+    # product meanwhile leaves it non-empty, so this never removes a token.
+    db.products.update_many(
+        {"_id": {"$in": list(product_ids)}, "pending_checkouts": {"$size": 0}},
+        {"$unset": {"pending_checkouts": ""}}
+    )
+
+
+def _compensate(db, quantities, token):
+    db.products.bulk_write(_compensate_ops(quantities, token), ordered=False)
+    _clear_pending(db, quantities)
+
+
+def commit_sale(db, sale, products=None):
+    """Decrement stock for every line of ``sale`` and insert it, all or nothing.
+
+    Returns the new sale id, or raises InsufficientStock naming the first
+    product that could not cover its quantity. Stock is left untouched when
+    the basket fails. Only products of the sale's business can be sold.
+    ``products`` is the pre-sale snapshot of the basket
+    (inventory.VALUE_FIELDS) used to move the inventory summary.
+    """
+    quantities = merge_quantities(sale['items'])
+    sold = {pid: -q for pid, q in quantities.items()}
+    deltas = inventory.stock_change_deltas(products or {}, sold)
+    business_id = sale.get('business_id')
+    client = db.client
+
+    if supports_transactions(client):
+        def run(session):
+            result = db.products.bulk_write(_decrement_ops(quantities, business_id), session=session)
+            if result.matched_count != len(quantities):
+                raise _Shortfall()
+            sale_id = db.sales.insert_one(sale, session=session).inserted_id
+            ledger.record(db, business_id, sold, 'sale', sale_id, session=session)
+            return sale_id
+
+        with client.start_session() as session:
+            try:
+                sale_id = session.with_transaction(run)
+            except _Shortfall:
+                raise InsufficientStock(_short_product_name(db, quantities, business_id))
+        # Every till writes these two documents; updating them inside the
+        # transaction would make concurrent sales conflict and retry.
+        inventory.apply_deltas(db, deltas)
+        inventory.refresh_low_stock_count(db, business_id)
+        catalog.bump(db, business_id)
+        return sale_id
+
+    # Standalone server: tag each decremented product with a token so a
+    # partial basket can be rolled back without touching concurrent sales.
+    token = ObjectId()
+    result = db.products.bulk_write(_decrement_ops(quantities, business_id, token), ordered=False)
+    if result.matched_count != len(quantities):
+        _compensate(db, quantities, token)
+        catalog.bump(db, business_id)
+        raise InsufficientStock(_short_product_name(db, quantities, business_id))
+
+    try:
+        sale_id = db.sales.insert_one(sale).inserted_id
+    except PyMongoError:
+        _compensate(db, quantities, token)
+        raise
+
+    ledger.record(db, business_id, sold, 'sale', sale_id)
+    db.products.update_many(
+        {"_id": {"$in": list(quantities)}},
+        {"$pull": {"pending_checkouts": token}}
+    )
+    _clear_pending(db, quantities)
+    inventory.apply_deltas(db, deltas)
+    inventory.refresh_low_stock_count(db, business_id)
+    catalog.bump(db, business_id)
+    return sale_id
+
+
+def commit_sales(db, sales, products=None):
+    """Commit a batch of independent sales of one business in a few writes.
+
+    Every sale is still all or nothing, and sales earlier in the list claim
+    stock first. All baskets are decremented in one ordered bulk write,
+    tagged per sale; sales left short are rolled back together, the rest
+    inserted with one insert_many. Returns a list aligned with ``sales``
+    holding each new sale id, or the InsufficientStock / DuplicateKeyError
+    that rejected it.
+    """
+    if not sales:
+        return []
+    business_id = sales[0].get('business_id')
+    baskets = [merge_quantities(sale['items']) for sale in sales]
+    tokens = [ObjectId() for _ in sales]
+    product_ids = list({product_id for basket in baskets for product_id in basket})
+    outcomes = [None] * len(sales)
+
+    ops = []
+    for basket, token in zip(baskets, tokens):
+        ops.extend(_decrement_ops(basket, business_id, token))
+    result = db.products.bulk_write(ops)
+
+    if result.matched_count != len(ops):
+        claimed = {}
+        for product in db.products.find(
+            {"_id": {"$in": product_ids}, "pending_checkouts": {"$in": tokens}},
+            {"pending_checkouts": 1}
+        ):
+            for token in product['pending_checkouts']:
+                claimed.setdefault(token, set()).add(product['_id'])
+        short = [i for i, (basket, token) in enumerate(zip(baskets, tokens))
+                 if len(claimed.get(token, ())) != len(basket)]
+        db.products.bulk_write(
+            [op for i in short for op in _compensate_ops(baskets[i], tokens[i])], ordered=False
+        )
+        for i in short:
+            outcomes[i] = InsufficientStock(_short_product_name(db, baskets[i], business_id))
+
+    pending = [i for i, outcome in enumerate(outcomes) if outcome is None]
+    if pending:
+        rejected = []
+        try:
+            db.sales.insert_many([sales[i] for i in pending], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details['writeErrors']:
+                i = pending[error['index']]
+                error_class = DuplicateKeyError if error['code'] == 11000 else OperationFailure
+                outcomes[i] = error_class(error['errmsg'], error['code'], error)
+                rejected.append(i)
+        except PyMongoError:
+            db.products.bulk_write(
+                [op for i in pending for op in _compensate_ops(baskets[i], tokens[i])], ordered=False
+            )
+            raise
+        if rejected:
+            db.products.bulk_write(
+                [op for i in rejected for op in _compensate_ops(baskets[i], tokens[i])], ordered=False
+            )
+        for i in pending:
+            if outcomes[i] is None:
+                outcomes[i] = sales[i]['_id']
+
+    db.products.update_many(
+        {"_id": {"$in": product_ids}},
+        {"$pull": {"pending_checkouts": {"$in": tokens}}}
+    )
+    _clear_pending(db, product_ids)
+    changes, moved = {}, []
+    for basket, outcome in zip(baskets, outcomes):
+        if isinstance(outcome, ObjectId):
+            moved += ledger.movements(business_id, {pid: -q for pid, q in basket.items()}, 'sale', outcome)
+            for product_id, quantity in basket.items():
+                changes[product_id] = changes.get(product_id, 0) - quantity
+    if moved:
+        db.stock_movements.insert_many(moved, ordered=False)
+    inventory.apply_deltas(db, inventory.stock_change_deltas(products or {}, changes))
+    inventory.refresh_low_stock_count(db, business_id)
+    catalog.bump(db, business_id)
+    return outcomes
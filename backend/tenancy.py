@@ -0,0 +1,62 @@
+from bson.objectid import ObjectId
+from flask import session
+
+
+UNASSIGNED = 'unassigned'
+TENANT_COLLECTIONS = ('products', 'suppliers', 'sales', 'purchases')
+
+
+def scope_key(business_id):
+    # Key for per-business bookkeeping documents (summaries, versions).
+    # Data not yet stamped with a business rolls up under UNASSIGNED.
+    return business_id if business_id else UNASSIGNED
+
+
+def current_business_id():
+    business_id = session.get('business_id')
+    return ObjectId(business_id) if business_id else None
+
+
+def scoped(query=None):
+    # Every read of a tenant collection goes through here, so a branch only
+    # ever sees (and pays for scanning) its own documents.
+    scoped_query = dict(query or {})
+    scoped_query['business_id'] = current_business_id()
+    return scoped_query
+
+
+def stamp(doc):
+    doc['business_id'] = current_business_id()
+    return doc
+
+
+def backfill(db, default_business_id=None):
+    """Stamp business_id on documents written before tenant scoping.
+
+    Sales take the business of the cashier who rang them up. Everything
+    else still unstamped goes to ``default_business_id``, or to the only
+    business when there is exactly one. Returns {collection: updated}.
+    """
+    if default_business_id is None and db.businesses.count_documents({}) == 1:
+        default_business_id = db.businesses.find_one({}, {"_id": 1})['_id']
+
+    unstamped = {"business_id": {"$exists": False}}
+    updated = dict.fromkeys(TENANT_COLLECTIONS, 0)
+
+    cashier_ids = db.sales.distinct("cashier_id", unstamped)
+    cashiers = db.users.find(
+        {"_id": {"$in": [ObjectId(c) for c in cashier_ids if ObjectId.is_valid(c)]}, "business_id": {"$ne": None}},
+        {"business_id": 1}
+    )
+    for cashier in cashiers:
+        result = db.sales.update_many(
+            {**unstamped, "cashier_id": str(cashier['_id'])},
+            {"$set": {"business_id": cashier['business_id']}}
+        )
+        updated['sales'] += result.modified_count
+
+    if default_business_id is not None:
+        for collection in TENANT_COLLECTIONS:
+            result = db[collection].update_many(unstamped, {"$set": {"business_id": default_business_id}})
+            updated[collection] += result.modified_count
+    return updated
@@ -0,0 +1,82 @@
+"""Checkout latency against basket size.
+
+Compares the old one-update-per-line checkout with ``commit_sale``. Runs
+against a throwaway database on MONGODB_URI (``stockflow_bench`` by default):
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.checkout_latency
+"""
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+
+from backend.stock import commit_sale
+
+
+def seed(db, count):
+    db.products.drop()
+    db.sales.drop()
+    result = db.products.insert_many([
+        {"name": f"Bench product {i}", "unit": "piece", "purchase_price": 50.0,
+         "selling_price": 80.0, "min_stock": 10, "current_quantity": 10 ** 9}
+        for i in range(count)
+    ])
+    return result.inserted_ids
+
+
+def basket(product_ids, size):
+    return {
+        "items": [{"product_id": str(pid), "quantity": 1, "selling_price": 80.0} for pid in product_ids[:size]],
+        "total_amount": 80.0 * size,
+        "payment_method": "cash",
+        "date": datetime.utcnow(),
+    }
+
+
+def legacy_checkout(db, sale):
+    for item in sale['items']:
+        db.products.update_one(
+            {"_id": ObjectId(item['product_id']), "current_quantity": {"$gte": item['quantity']}},
+            {"$inc": {"current_quantity": -item['quantity']}}
+        )
+    return db.sales.insert_one(sale).inserted_id
+
+
+def measure(fn, db, product_ids, size, rounds):
+    samples = []
+    for _ in range(rounds):
+        sale = basket(product_ids, size)
+        start = time.perf_counter()
+        fn(db, sale)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1,5,10,20,40')
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--database', default='stockflow_bench')
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017')
+    db = client[args.database]
+    sizes = [int(s) for s in args.sizes.split(',')]
+    product_ids = seed(db, max(sizes))
+
+    print(f"{'basket':>6} {'legacy p50':>11} {'legacy p95':>11} {'batched p50':>12} {'batched p95':>12}")
+    for size in sizes:
+        legacy = measure(legacy_checkout, db, product_ids, size, args.rounds)
+        batched = measure(commit_sale, db, product_ids, size, args.rounds)
+        print(f"{size:>6} {legacy[0]:>9.2f}ms {legacy[1]:>9.2f}ms {batched[0]:>10.2f}ms {batched[1]:>10.2f}ms")
+
+    client.drop_database(args.database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Synthetic StockFlow dataset: businesses, users, products, suppliers and
+history.
+
+Every business gets an admin and cashiers (all with the password
+``bench``), a catalogue, suppliers, and ``--sales`` / ``--purchases`` spread
+over the last ``--days`` days. Documents have the same shape the app writes
+(line snapshots, tenant stamps, low-stock flags). The inventory summaries
+and sales rollups are then rebuilt. Seeding is deterministic for a given
+``--seed``.
+
+    python -m benchmarks.dataset --businesses 3 --products 500 --sales 20000 --drop
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from backend import inventory, ledger, rollups
+from backend.config import Config
+from backend.passwords import _hash
+
+PASSWORD = 'bench'
+UNITS = ('piece', 'kg', 'litre', 'packet', 'box')
+WORDS = ('Sugar', 'Rice', 'Maize flour', 'Milk', 'Bread', 'Cooking oil', 'Salt', 'Tea leaves',
+         'Soap', 'Eggs', 'Beans', 'Spaghetti', 'Margarine', 'Juice', 'Biscuits', 'Toothpaste')
+SEEDED = ('businesses', 'users', 'products', 'suppliers', 'sales', 'purchases',
+          'sales_rollups', 'inventory_summary', 'catalog_versions', 'jobs', 'stock_movements',
+          'stock_snapshots')
+BATCH = 5000
+
+
+def _insert(collection, docs):
+    for start in range(0, len(docs), BATCH):
+        collection.insert_many(docs[start:start + BATCH], ordered=False)
+
+
+def _lines(rng, products, price_field, max_lines):
+    lines = []
+    for product in rng.sample(products, min(len(products), rng.randint(1, max_lines))):
+        line = {
+            "product_id": str(product['_id']),
+            "product_name": product['name'],
+            "unit": product['unit'],
+            "quantity": rng.randint(1, 5),
+        }
+        if price_field == 'selling_price':
+            line['selling_price'] = product['selling_price']
+            line['cost_price'] = product['purchase_price']
+        else:
+            line['cost_price'] = round(product['purchase_price'] * rng.uniform(0.9, 1.1), 2)
+        lines.append(line)
+    return lines
+
+
+def generate(db, businesses=3, products=500, suppliers=20, cashiers=5, sales=20000, purchases=2000,
+             days=90, seed=42, offset_hours=Config.REPORT_UTC_OFFSET_HOURS):
+    """Seed ``db`` and return a manifest of ids for benchmarks to use.
+
+    ``products``, ``suppliers``, ``sales`` and ``purchases`` are per business.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = _hash(PASSWORD, 4)
+    manifest = {"password": PASSWORD, "super_admin": "bench-root", "businesses": []}
+
+    db.users.insert_one({"username": "bench-root", "password_hash": password_hash, "role": "super_admin",
+                         "created_at": now})
+
+    for b in range(businesses):
+        business_id = db.businesses.insert_one({
+            "name": f"Bench shop {b}", "location": "Nairobi", "created_at": now - timedelta(days=days)
+        }).inserted_id
+        users = [{"username": f"bench-{b}-admin", "role": "admin"}] + [
+            {"username": f"bench-{b}-cashier-{c}", "role": "cashier"} for c in range(cashiers)
+        ]
+        for user in users:
+            user.update(password_hash=password_hash, business_id=business_id, created_at=now)
+        _insert(db.users, users)
+
+        catalogue = []
+        for p in range(products):
+            purchase_price = round(rng.uniform(20, 2000), 2)
+            quantity = rng.randint(0, 400)
+            min_stock = rng.choice((5, 10, 20))
+            catalogue.append({
+                "name": f"{rng.choice(WORDS)} {p}", "description": "", "unit": rng.choice(UNITS),
+                "sku": f"B{b}-{p:06d}", "purchase_price": purchase_price,
+                "selling_price": round(purchase_price * rng.uniform(1.1, 1.5), 2),
+                "min_stock": min_stock, "max_stock": min_stock * 10, "current_quantity": quantity,
+                "is_low_stock": quantity < min_stock, "business_id": business_id,
+                "created_at": now - timedelta(days=days), "updated_at": now - timedelta(days=rng.randint(0, days)),
+            })
+        _insert(db.products, catalogue)
+        ledger.true_up(db, business_id)
+
+        vendors = [{"name": f"Supplier {b}-{s}", "contact_person": "", "phone": f"07{s:08d}",
+                    "email": "", "address": "", "business_id": business_id} for s in range(suppliers)]
+        _insert(db.suppliers, vendors)
+
+        history = []
+        for _ in range(sales):
+            cashier = rng.choice(users[1:] or users)
+            items = _lines(rng, catalogue, 'selling_price', 6)
+            history.append({
+                "items": items,
+                "total_amount": sum(i['quantity'] * i['selling_price'] for i in items),
+                "payment_method": rng.choice(('cash', 'cash', 'mpesa')),
+                "date": now - timedelta(seconds=rng.randint(0, days * 86400)),
+                "cashier_id": str(cashier['_id']), "cashier_name": cashier['username'],
+                "business_id": business_id,
+            })
+        _insert(db.sales, history)
+
+        deliveries = []
+        for _ in range(purchases):
+            supplier = rng.choice(vendors)
+            items = _lines(rng, catalogue, 'cost_price', 12)
+            deliveries.append({
+                "supplier_id": supplier['_id'], "supplier_name": supplier['name'], "items": items,
+                "total_cost": sum(i['quantity'] * i['cost_price'] for i in items),
+                "date": now - timedelta(seconds=rng.randint(0, days * 86400)),
+                "business_id": business_id,
+            })
+        _insert(db.purchases, deliveries)
+
+        manifest["businesses"].append({
+            "business_id": str(business_id),
+            "admin": users[0]['username'],
+            "cashiers": [u['username'] for u in users[1:]],
+            "admin_id": str(users[0]['_id']),
+            "cashier_ids": [str(u['_id']) for u in users[1:]],
+            "product_ids": [str(p['_id']) for p in catalogue],
+            "sale_ids": [str(s['_id']) for s in rng.sample(history, min(50, len(history)))],
+            "purchase_ids": [str(p['_id']) for p in rng.sample(deliveries, min(50, len(deliveries)))],
+        })
+
+    inventory.reconcile_all(db)
+    rollups.rebuild(db, offset_hours)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--businesses', type=int, default=3)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--suppliers', type=int, default=20)
+    parser.add_argument('--cashiers', type=int, default=5)
+    parser.add_argument('--sales', type=int, default=20000)
+    parser.add_argument('--purchases', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='Empty the seeded collections first.')
+    parser.add_argument('--manifest', default=None, help='Write the manifest JSON here.')
+    args = parser.parse_args()
+
+    # The app always reads the stockflow database
+    db = MongoClient(os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017').stockflow
+    if args.drop:
+        for collection in SEEDED:
+            db[collection].drop()
+    elif db.businesses.estimated_document_count():
+        parser.error('stockflow already has data; pass --drop to replace it')
+
+    manifest = generate(db, args.businesses, args.products, args.suppliers, args.cashiers,
+                        args.sales, args.purchases, args.days, args.seed)
+    if args.manifest:
+        with open(args.manifest, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    print(f"Seeded {args.businesses} businesses x {args.products} products, "
+          f"{args.sales} sales and {args.purchases} purchases each.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""End-to-end route benchmarks with JSON results.
+
+Drives every main route through the Flask test client, in process, or
+against a running server with ``--url``. It reports latency percentiles,
+throughput and database operations per request.
+
+    # throwaway in-memory data (needs mongomock installed)
+    python -m benchmarks.harness --mongomock --output bench.json
+
+    # a local mongod seeded with benchmarks.dataset
+    python -m benchmarks.dataset --drop --manifest manifest.json
+    python -m benchmarks.harness --manifest manifest.json --output bench.json
+
+    # a running gunicorn, 8 clients per route
+    python -m benchmarks.harness --manifest manifest.json --url http://127.0.0.1:8000 --concurrency 8
+
+Pass ``--baseline old.json`` to print the change per route against an
+earlier run. Operation counts come from a pymongo CommandListener, or
+from wrapping mongomock's collection methods. They are not collected
+against ``--url``.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo import monitoring
+
+
+# (name, role, method, path, body) - path and body are filled from a
+# business in the manifest; role picks which session the request runs as.
+ROUTES = [
+    ("dashboard.admin", "admin", "GET", "/dashboard", None),
+    ("dashboard.super_admin", "super_admin", "GET", "/dashboard", None),
+    ("businesses", "super_admin", "GET", "/businesses", None),
+    ("users", "admin", "GET", "/users", None),
+    ("products.index", "admin", "GET", "/products/", None),
+    ("products.low_stock", "admin", "GET", "/products/low-stock", None),
+    ("products.reorder_queue", "admin", "GET", "/products/reorder-queue", None),
+    ("suppliers.index", "admin", "GET", "/suppliers/", None),
+    ("pos.index", "cashier", "GET", "/pos/", None),
+    ("pos.search", "cashier", "GET", "/pos/search?q={word}", None),
+    ("pos.checkout", "cashier", "POST", "/pos/checkout", "checkout"),
+    ("pos.receipt", "cashier", "GET", "/pos/receipt/{sale_id}", None),
+    ("sales.index", "admin", "GET", "/sales/", None),
+    ("purchases.index", "admin", "GET", "/purchases/", None),
+    ("purchases.new", "admin", "GET", "/purchases/new", None),
+    ("purchases.receipt", "admin", "GET", "/purchases/receipt/{purchase_id}", None),
+    ("reports.sales", "admin", "GET", "/reports/sales?range=month", None),
+    ("exports.sales", "admin", "GET", "/exports/sales.csv?start={week_ago}", None),
+]
+WORDS = ('sugar', 'rice', 'milk', 'bread', 'oil', 'tea', 'soap', 'beans')
+
+
+class OperationCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.local = threading.local()
+
+    def reset(self):
+        self.local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self.local, 'count', 0)
+
+    def started(self, event):
+        if event.command_name not in ('hello', 'isMaster', 'ismaster', 'endSessions', 'ping'):
+            self.local.count = self.count + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+MONGOMOCK_METHODS = ('find', 'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many',
+                     'replace_one', 'delete_one', 'delete_many', 'bulk_write', 'aggregate',
+                     'count_documents', 'distinct', 'find_one_and_update', 'find_one_and_delete')
+
+
+def count_mongomock(counter):
+    # mongomock sends no command events; count calls on its collections instead
+    import mongomock
+
+    def counted(method):
+        def wrapper(self, *args, **kwargs):
+            counter.local.count = counter.count + 1
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    for name in MONGOMOCK_METHODS:
+        setattr(mongomock.Collection, name, counted(getattr(mongomock.Collection, name)))
+
+
+def fill(template, business, rng):
+    return template.format(
+        word=rng.choice(WORDS),
+        sale_id=rng.choice(business['sale_ids']),
+        purchase_id=rng.choice(business['purchase_ids']),
+        week_ago=datetime.utcfromtimestamp(time.time() - 7 * 86400).strftime('%Y-%m-%d'),
+    )
+
+
+def checkout_body(business, rng):
+    return {"items": [
+        {"product_id": product_id, "quantity": 1, "selling_price": 100.0}
+        for product_id in rng.sample(business['product_ids'], 3)
+    ]}
+
+
+class TestClientDriver:
+    def __init__(self, app, manifest):
+        self.app = app
+        self.clients = {}
+        business = manifest['businesses'][0]
+        sessions = {
+            "super_admin": {"user_id": "bench", "username": manifest['super_admin'],
+                            "role": "super_admin", "business_id": None},
+            "admin": {"user_id": business['admin_id'], "username": business['admin'],
+                      "role": "admin", "business_id": business['business_id']},
+            "cashier": {"user_id": business['cashier_ids'][0], "username": business['cashiers'][0],
+                        "role": "cashier", "business_id": business['business_id']},
+        }
+        for role, values in sessions.items():
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session.update(values)
+            self.clients[role] = client
+
+    def request(self, role, method, path, body):
+        response = self.clients[role].open(path, method=method, json=body)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class HttpDriver:
+    def __init__(self, url, manifest):
+        self.url = url.rstrip('/')
+        self.openers = {}
+        business = manifest['businesses'][0]
+        for role, username in (("super_admin", manifest['super_admin']), ("admin", business['admin']),
+                               ("cashier", business['cashiers'][0])):
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+            data = urllib.parse.urlencode({"username": username, "password": manifest['password']}).encode()
+            opener.open(f"{self.url}/login", data, timeout=30)
+            self.openers[role] = opener
+
+    def request(self, role, method, path, body):
+        data, headers = None, {}
+        if body is not None:
+            data, headers = json.dumps(body).encode(), {"Content-Type": "application/json"}
+        request = urllib.request.Request(self.url + path, data, headers, method=method)
+        try:
+            with self.openers[role].open(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def measure(driver, counter, business, route, requests, warmup, concurrency, seed):
+    name, role, method, template, body = route
+    rng = random.Random(seed)
+    calls = [(fill(template, business, rng), checkout_body(business, rng) if body else None)
+             for _ in range(requests + warmup)]
+    for path, payload in calls[:warmup]:
+        driver.request(role, method, path, payload)
+
+    def one(call):
+        path, payload = call
+        if counter:
+            counter.reset()
+        start = time.perf_counter()
+        status = driver.request(role, method, path, payload)
+        return (time.perf_counter() - start) * 1000, status, counter.count if counter else None
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, calls[warmup:]))
+    else:
+        results = [one(call) for call in calls[warmup:]]
+    elapsed = time.perf_counter() - start
+
+    samples = sorted(r[0] for r in results)
+    queries = [r[2] for r in results if r[2] is not None]
+    return {
+        "requests": requests,
+        "errors": sum(1 for r in results if r[1] >= 400),
+        "throughput_rps": round(requests / elapsed, 1),
+        "mean_ms": round(statistics.fmean(samples), 2),
+        "p50_ms": round(samples[len(samples) // 2], 2),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2),
+        "queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+def compare(results, baseline):
+    print(f"\n{'route':<24} {'p95 before':>11} {'p95 after':>10} {'change':>8} {'queries':>12}")
+    for name, after in results['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before:
+            continue
+        change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        queries = f"{before['queries_per_request']} -> {after['queries_per_request']}"
+        print(f"{name:<24} {before['p95_ms']:>9.2f}ms {after['p95_ms']:>8.2f}ms {change:>+7.1f}% {queries:>12}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mongomock', action='store_true', help='Seed and run against in-memory mongomock.')
+    parser.add_argument('--manifest', help='Manifest written by benchmarks.dataset.')
+    parser.add_argument('--url', help='Benchmark a running server instead of the test client.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--routes', default=None, help='Comma-separated route names to run.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Dataset size multiplier for --mongomock.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--baseline', default=None)
+    args = parser.parse_args()
+    if not (args.mongomock or args.manifest):
+        parser.error('pass --mongomock, or --manifest from benchmarks.dataset')
+
+    counter = None
+    if args.url:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+        driver = HttpDriver(args.url, manifest)
+    else:
+        # Background work inline, so its queries count against the request
+        os.environ.setdefault('JOB_WORKERS', '0')
+        os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+        counter = OperationCounter()
+        if args.mongomock:
+            import mongomock
+            import pymongo
+            pymongo.MongoClient = mongomock.MongoClient
+            os.environ['ENSURE_INDEXES'] = 'false'
+        else:
+            monitoring.register(counter)
+        from backend.app import app
+        if args.mongomock:
+            from backend import stock
+            from benchmarks.dataset import generate
+            # mongomock has no 'hello' command; it behaves as a standalone server
+            stock._transaction_support[id(app.db.client)] = False
+            manifest = generate(app.db, businesses=2, products=int(300 * args.scale),
+                                suppliers=10, sales=int(3000 * args.scale), purchases=int(300 * args.scale),
+                                seed=args.seed)
+            count_mongomock(counter)
+        else:
+            with open(args.manifest) as f:
+                manifest = json.load(f)
+        driver = TestClientDriver(app, manifest)
+
+    selected = set(args.routes.split(',')) if args.routes else None
+    business = manifest['businesses'][0]
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "target": args.url or ('test-client/mongomock' if args.mongomock else 'test-client/mongod'),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "routes": {},
+    }
+    print(f"{'route':<24} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'errors':>7}")
+    for route in ROUTES:
+        if selected and route[0] not in selected:
+            continue
+        result = measure(driver, counter, business, route, args.requests, args.warmup, args.concurrency, args.seed)
+        results['routes'][route[0]] = result
+        print(f"{route[0]:<24} {result['throughput_rps']:>8} {result['p50_ms']:>7}ms {result['p95_ms']:>7}ms "
+              f"{result['p99_ms']:>7}ms {str(result['queries_per_request']):>8} {result['errors']:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
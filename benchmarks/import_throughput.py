@@ -0,0 +1,53 @@
+"""Bulk product import throughput in rows per second.
+
+Imports a generated CSV price list twice per chunk size: once into an empty
+catalog (all inserts) and once more over it (all updates). Runs against a
+throwaway database on MONGODB_URI (``stockflow_bench`` by default):
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.import_throughput
+"""
+import argparse
+import io
+import os
+
+from pymongo import MongoClient
+
+from backend.imports import import_products, parse
+from backend.indexes import INDEXES
+
+
+def price_list(rows):
+    lines = ["name,sku,unit,purchase_price,selling_price,min_stock,current_quantity"]
+    lines.extend(f"Bench product {i},SKU-{i:06d},piece,{50 + i % 50},{80 + i % 50},10,{i % 500}" for i in range(rows))
+    return "\n".join(lines).encode('utf-8')
+
+
+def run(db, data, chunk_size):
+    return import_products(db, parse(io.BytesIO(data), 'bench.csv'), None, chunk_size=chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--chunks', default='1,100,500,1000')
+    parser.add_argument('--database', default='stockflow_bench')
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017')
+    db = client[args.database]
+    data = price_list(args.rows)
+
+    print(f"{'chunk':>6} {'insert rows/s':>14} {'update rows/s':>14}")
+    for chunk_size in [int(c) for c in args.chunks.split(',')]:
+        db.products.drop()
+        db.products.create_indexes(INDEXES['products'])
+        inserted = run(db, data, chunk_size)
+        updated = run(db, data, chunk_size)
+        print(f"{chunk_size:>6} {inserted['rows'] / inserted['seconds']:>14.0f} "
+              f"{updated['rows'] / updated['seconds']:>14.0f}")
+
+    client.drop_database(args.database)
+
+
+if __name__ == '__main__':
+    main()
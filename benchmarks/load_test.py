@@ -0,0 +1,163 @@
+"""Load test: the old default server against the production profile.
+
+Starts gunicorn twice on the same database: once as the old Procfile did
+(``gunicorn backend.app:app``: one sync worker, driver pool defaults,
+no background work), once with
+gunicorn.conf.py. Each time ``--users`` simulated tills log in and then
+alternate POS searches and one-line checkouts for ``--seconds``.
+
+The app always uses the ``stockflow`` database, so point MONGODB_URI at a
+scratch server; the bench business and its data are removed afterwards:
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.load_test --users 32
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+from pymongo import MongoClient
+
+from backend.passwords import _hash
+
+PROFILES = {
+    "default": ["gunicorn", "backend.app:app"],
+    "production": ["gunicorn", "-c", "gunicorn.conf.py", "backend.app:app"],
+}
+# The old setup: driver pool defaults, acknowledged writes, everything inline
+DEFAULT_ENV = {
+    "MONGO_MAX_POOL_SIZE": "100", "MONGO_MIN_POOL_SIZE": "0", "MONGO_WRITE_CONCERN": "1",
+    "JOB_WORKERS": "0", "PASSWORD_HASH_WORKERS": "0",
+}
+PASSWORD = 'load-test'
+
+
+def seed(db, users, products):
+    business_id = db.businesses.insert_one({"name": "Load test", "created_at": datetime.utcnow()}).inserted_id
+    password_hash = _hash(PASSWORD, 4)
+    db.users.insert_many([
+        {"username": f"loadtest-{i}", "password_hash": password_hash, "role": "cashier",
+         "business_id": business_id, "created_at": datetime.utcnow()}
+        for i in range(users)
+    ])
+    now = datetime.utcnow()
+    product_ids = db.products.insert_many([
+        {"name": f"Bench product {i}", "description": "", "unit": "piece", "purchase_price": 50.0,
+         "selling_price": 80.0, "min_stock": 10, "max_stock": None, "current_quantity": 10 ** 9,
+         "is_low_stock": False, "business_id": business_id, "created_at": now, "updated_at": now}
+        for i in range(products)
+    ]).inserted_ids
+    return business_id, [str(p) for p in product_ids]
+
+
+def cleanup(db, business_id):
+    for collection in ('users', 'products', 'sales', 'sales_rollups', 'stock_movements'):
+        db[collection].delete_many({"business_id": business_id})
+    db.inventory_summary.delete_one({"_id": business_id})
+    db.catalog_versions.delete_one({"_id": business_id})
+    db.businesses.delete_one({"_id": business_id})
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def till(base, username, product_ids, stop, samples, errors):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    login = urllib.parse.urlencode({"username": username, "password": PASSWORD}).encode()
+    opener.open(f"{base}/login", login, timeout=30)
+    while not stop.is_set():
+        for request in (
+            urllib.request.Request(f"{base}/pos/search?q=bench+{random.randint(0, 99)}"),
+            urllib.request.Request(
+                f"{base}/pos/checkout",
+                json.dumps({"items": [{"product_id": random.choice(product_ids), "quantity": 1,
+                                       "selling_price": 80.0}]}).encode(),
+                {"Content-Type": "application/json"}
+            ),
+        ):
+            start = time.perf_counter()
+            try:
+                opener.open(request, timeout=30).read()
+                samples.append((time.perf_counter() - start) * 1000)
+            except OSError:
+                errors.append(1)
+
+
+def run(profile, base, port, users, seconds, product_ids):
+    env = dict(os.environ, PORT=str(port), ENSURE_INDEXES='false')
+    if profile == "default":
+        env.update(DEFAULT_ENV)
+    command = PROFILES[profile] + (["--bind", f"127.0.0.1:{port}"] if profile == "default" else [])
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(f"{base}/login")
+        stop, samples, errors = threading.Event(), [], []
+        threads = [
+            threading.Thread(target=till, args=(base, f"loadtest-{i}", product_ids, stop, samples, errors))
+            for i in range(users)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+    samples.sort()
+    return {
+        "requests_per_second": round(len(samples) / seconds, 1),
+        "p50_ms": round(statistics.median(samples), 1) if samples else None,
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 1) if samples else None,
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1], 1) if samples else None,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--seconds', type=int, default=20)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017')
+    db = client.stockflow
+    business_id, product_ids = seed(db, args.users, args.products)
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        print(f"{args.users} tills, {args.seconds}s per profile")
+        print(f"{'profile':>10} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+        for profile in PROFILES:
+            result = run(profile, base, args.port, args.users, args.seconds, product_ids)
+            print(f"{profile:>10} {result['requests_per_second']:>8} {result['p50_ms']:>7}ms "
+                  f"{result['p95_ms']:>7}ms {result['p99_ms']:>7}ms {result['errors']:>7}")
+    finally:
+        cleanup(db, business_id)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Login-storm throughput against the password hashing pool size.
+
+Simulates ``--logins`` cashiers verifying their passwords at once from
+``--threads`` request threads, for each pool size in ``--workers`` (0 means
+hashing inline on the request thread). No database is needed:
+
+    python -m benchmarks.login_storm --rounds 12 --workers 0,1,2,4
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.passwords import PasswordHasher, _hash
+
+
+def storm(hasher, password_hash, logins, threads):
+    def login(_):
+        start = time.perf_counter()
+        assert hasher.check(password_hash, 'shift-change')
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        samples = sorted(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    return logins / elapsed, statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--logins', type=int, default=30)
+    parser.add_argument('--threads', type=int, default=30)
+    parser.add_argument('--workers', default='0,1,2,4')
+    args = parser.parse_args()
+
+    password_hash = _hash('shift-change', args.rounds)
+    print(f"bcrypt cost {args.rounds}, {args.logins} logins from {args.threads} threads")
+    print(f"{'workers':>7} {'logins/s':>9} {'p50':>9} {'p95':>9}")
+    for workers in [int(w) for w in args.workers.split(',')]:
+        hasher = PasswordHasher(rounds=args.rounds, workers=workers)
+        if workers:
+            hasher.check(password_hash, 'shift-change')  # start the pool outside the timing
+        rate, p50, p95 = storm(hasher, password_hash, args.logins, args.threads)
+        print(f"{workers:>7} {rate:>9.1f} {p50:>7.0f}ms {p95:>7.0f}ms")
+        hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
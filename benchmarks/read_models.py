@@ -0,0 +1,93 @@
+"""Full documents against the projected read models of backend/models/rows.
+
+For the suppliers and users list pages, compares ``list(find(query))``
+with ``rows.fetch``: wall time, BSON bytes returned, and memory allocated
+while building the list (tracemalloc peak) and held by it afterwards.
+
+Runs in a scratch ``stockflow_bench_rows`` database that is dropped at the
+end, or in memory with ``--mongomock``:
+
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.read_models --docs 5000
+"""
+import argparse
+import os
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import bson
+from pymongo import MongoClient
+
+from backend.models.rows import SupplierRow, UserRow, fetch
+from backend.passwords import _hash
+
+
+def seed(db, docs, business_id):
+    now = datetime.utcnow()
+    password_hash = _hash('bench', 4)
+    db.suppliers.insert_many([
+        {"name": f"Supplier {i}", "contact_person": "Jane Wanjiku", "phone": f"07{i:08d}",
+         "email": f"orders{i}@example.co.ke", "address": "Industrial Area, Nairobi",
+         "business_id": business_id, "created_at": now, "notes": "Delivers Tuesdays and Fridays. " * 4}
+        for i in range(docs)
+    ])
+    db.users.insert_many([
+        {"username": f"cashier-{i}", "password_hash": password_hash, "role": "cashier",
+         "business_id": business_id, "created_at": now}
+        for i in range(docs)
+    ])
+
+
+def measure(load, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        load()
+        times.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    result = load()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, statistics.median(times), held, peak
+
+
+def returned_bytes(collection, query, projection=None):
+    return sum(len(bson.encode(doc)) for doc in collection.find(query, projection))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', type=int, default=2000, help='Suppliers and users to seed.')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--mongomock', action='store_true', help='Use in-memory mongomock instead.')
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017')
+    db = client.stockflow_bench_rows
+    business_id = bson.ObjectId()
+    seed(db, args.docs, business_id)
+    query = {"business_id": business_id}
+
+    try:
+        print(f"{args.docs} documents per list, median of {args.repeats}")
+        print(f"{'page':<10} {'path':<6} {'time':>9} {'returned':>11} {'peak':>11} {'held':>11}")
+        for page, collection, row in (('suppliers', db.suppliers, SupplierRow), ('users', db.users, UserRow)):
+            for path, load, projection in (
+                ('dicts', lambda: list(collection.find(query)), None),
+                ('rows', lambda: fetch(collection, row, query), row.PROJECTION),
+            ):
+                _, ms, held, peak = measure(load, args.repeats)
+                size = returned_bytes(collection, query, projection)
+                print(f"{page:<10} {path:<6} {ms:>7.1f}ms {size / 1024:>8.0f}KiB "
+                      f"{peak / 1024:>8.0f}KiB {held / 1024:>8.0f}KiB")
+    finally:
+        client.drop_database('stockflow_bench_rows')
+
+
+if __name__ == '__main__':
+    main()
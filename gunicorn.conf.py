@@ -0,0 +1,26 @@
+# Production server profile; settings live in backend/config.py so the app
+# can validate them against its Mongo pool at startup.
+import os
+
+from backend.config import Config
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = Config.WEB_CONCURRENCY
+worker_class = Config.GUNICORN_WORKER_CLASS
+threads = Config.GUNICORN_THREADS
+worker_connections = Config.GUNICORN_WORKER_CONNECTIONS
+timeout = Config.GUNICORN_TIMEOUT
+graceful_timeout = Config.GUNICORN_TIMEOUT
+keepalive = Config.GUNICORN_KEEPALIVE
+# Recycle workers now and then so a slow leak cannot take a till down
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = '-'
+
+
+def worker_exit(server, worker):
+    # Let queued post-checkout jobs finish before the process goes away
+    from backend.jobs import job_queue
+    from backend.passwords import password_hasher
+    job_queue.drain(timeout=Config.GUNICORN_TIMEOUT)
+    password_hasher.shutdown()